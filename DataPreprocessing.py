@@ -1,8 +1,5 @@
 import os
 import io
-from numpy import character
-import pandas as pd
-from pypinyin import lazy_pinyin
 
 
 def word_dataset_processing():
@@ -30,6 +27,10 @@ def word_dataset_processing():
 
 
 def pinyin_corpus_processing():
+    # pandas / pypinyin 只在处理拼音语料时需要
+    import pandas as pd
+    from pypinyin import lazy_pinyin
+
     # 处理汉语拼音数据集
     excel = pd.read_excel('./lib/CorpusWordlist.xls', header=None, index_col=None)
     sheet = excel.iloc[7:, 1:3]
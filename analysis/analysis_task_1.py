@@ -4,10 +4,17 @@ from collections import Counter
 import os
 import pickle
 import re
-from pyecharts import options as opts
-from pyecharts.charts import Page, Pie
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+from password_structure import unique_counts
 
 def show_pie(title, labels, values):
+    # pyecharts 只在绘图时用到，延迟导入以加快脚本启动
+    from pyecharts import options as opts
+    from pyecharts.charts import Pie
+
     pie = (
             Pie()
             .add("", [list(z) for z in zip(labels, values)], radius=["40%","75%"])
@@ -23,6 +30,7 @@ def show_pie(title, labels, values):
     
 FILE_NAME = 'yahoo'
 # FILE_NAME = 'csdn'
+FILE_NAME = os.getenv('ANALYSIS_DATASET', FILE_NAME).lower()
 FILE_PATH = "../data/" + FILE_NAME + ".txt" # 453491
 TOTAL_COUNT = None
 
@@ -126,6 +134,7 @@ def length_analysis(title, passwords):
     show_pie(title, [item[0] for item in sorted_dict], [item[1] for item in sorted_dict])
 
 def topN(title, lst, N=10):
+    # lst 可以是逐条的模式列表（旧版 patterns.pkl），也可以是 pattern_analysis 返回的 Counter
     counter = Counter(lst)
     topn = counter.most_common(N)
     print('\n最常见的十种结构是（A代表字母，N代表数字，O代表其它字符）：')
@@ -141,12 +150,15 @@ def topN(title, lst, N=10):
         else:
             print(topn[i][0], '\t', topn[i][1], '\t', round(
                 int(topn[i][1])/TOTAL_COUNT*100, 2), '%')
-    show_pie('topn_' + title, labels, values)
-
-def pattern_analysis(passwords):
-    patterns = []
-    patterns_advance = []
-    for i, password in enumerate(passwords):
+    show_pie('./results/topn_' + title, labels, values)
+
+def pattern_analysis(passwords, weights=None):
+    # 返回 (模式 -> 次数) 的 Counter；weights 为去重口令的出现次数，缺省时每条计 1
+    patterns = Counter()
+    patterns_advance = Counter()
+    if weights is None:
+        weights = [1] * len(passwords)
+    for i, (password, weight) in enumerate(zip(passwords, weights)):
         pattern = re.sub(r'[a-zA-Z]', 'A', password, count=0)
         pattern = re.sub(r'[^0-9a-zA-Z]', 'O', pattern, count=0)
         pattern = re.sub(r'[0-9]', 'N', pattern, count=0)
@@ -155,8 +167,8 @@ def pattern_analysis(passwords):
         pattern_advance = re.sub(r'[A]+', 'A', pattern_advance, count=0)
         pattern_advance = re.sub(r'[O]+', 'O', pattern_advance, count=0)
 
-        patterns.append(pattern)
-        patterns_advance.append(pattern_advance)
+        patterns[pattern] += weight
+        patterns_advance[pattern_advance] += weight
 
         if(i % 1e6 == 0):
             print(i)
@@ -166,7 +178,9 @@ def pattern_analysis(passwords):
 
 def main():
 
-    passwords = init_data()
+    with stage('analysis_task_1.load') as st:
+        passwords = init_data()
+        st.add(len(passwords))
 
     # 组成元素分析
     """
@@ -192,19 +206,22 @@ def main():
 
     """[长度分析]
     """
-    length_analysis(FILE_NAME + '长度分析', passwords)
+    with stage('analysis_task_1.length', items=len(passwords)):
+        length_analysis(FILE_NAME + '长度分析', passwords)
 
     # 构成模式
     if not os.path.exists('patterns.pkl'):
-        patterns, patterns_advance = pattern_analysis(passwords)
+        with stage('analysis_task_1.pattern', items=len(passwords)):
+            uniques, counts = unique_counts(passwords)
+            patterns, patterns_advance = pattern_analysis(uniques, counts)
         with open('patterns.pkl', 'wb') as f:
             pickle.dump((patterns, patterns_advance), f)
     else:
         with open('patterns.pkl', 'rb') as f:
             patterns, patterns_advance = pickle.load(f)
 
-    topN('./result/' + FILE_NAME + '构成模式_base', patterns)
-    topN('./result/' + FILE_NAME + '构成模式_advance', patterns_advance)
+    topN(FILE_NAME + '构成模式_base', patterns)
+    topN(FILE_NAME + '构成模式_advance', patterns_advance)
 
 
 if __name__ == '__main__':
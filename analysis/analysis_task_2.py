@@ -1,8 +1,14 @@
+import os
 import re
 import pickle
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
 
 FILE_NAME = 'yahoo'
 # FILE_NAME = 'csdn'
+FILE_NAME = os.getenv('ANALYSIS_DATASET', FILE_NAME).lower()
 FILE_PATH = '../data/' + FILE_NAME + ".txt"
 TOTAL_COUNT = None
 
@@ -178,7 +184,9 @@ def components_analysis(passwords):
     return result
 
 if __name__ == '__main__':
-    passwords = init_data()
+    with stage('analysis_task_2.load') as st:
+        passwords = init_data()
+        st.add(len(passwords))
     # csdn = open(r'./mid/csdn_date_result.pkl', 'wb')
     # yahoo = open(r'./mid/yahoo_date_result.pkl', 'wb')
     # F = open(r'data_csdn.pkl', 'rb')
@@ -187,6 +195,7 @@ if __name__ == '__main__':
     # passwords_yahoo = pickle.load(E)
     # passwords_csdn = passwords_csdn[0]
     # passwords_yahoo = passwords_yahoo[0]
-    print(components_analysis(passwords))
+    with stage('analysis_task_2.components', items=len(passwords)):
+        print(components_analysis(passwords))
     # pickle.dump(components_analysis(passwords_csdn)[0:2] + components_analysis(passwords_csdn)[3:6], csdn)
     # pickle.dump(components_analysis(passwords_yahoo)[0:2] + components_analysis(passwords_yahoo)[3:6], yahoo)
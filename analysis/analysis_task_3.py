@@ -1,10 +1,16 @@
-from math import log
+import os
 import re
 import pickle
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage, timed
+from password_structure import unique_counts
 
 
 # FILE_NAME = 'yahoo'
 FILE_NAME = 'csdn'
+FILE_NAME = os.getenv('ANALYSIS_DATASET', FILE_NAME).lower()
 FILE_PATH = "../data/" + FILE_NAME + ".txt" # 453491
 TOTAL_COUNT = None
 
@@ -28,48 +34,30 @@ def init_data():
     return passwords
 
 
-# Build a cost dictionary, assuming Zipf's law and cost = -math.log(probability).
 lib_path = './lib/word_lib.txt'
 # lib_path = './lib/pinyin_lib.txt'
-words = open(lib_path, encoding='utf-8').read().split()
-wordcost = dict((k, log((i + 1) * log(len(words)))) for i, k in enumerate(words))
-maxword = max(len(x) for x in words)
+
+
+def load_lexicon():
+    """首次调用时加载预编译的词库代价表（见 lexicon.py）"""
+    from lexicon import get_lexicon
+    return get_lexicon(lib_path)
 
 
 # Vocabulary extraction
+@timed('analysis_task_3.infer_spaces')
 def infer_spaces(s):
-    """Uses dynamic programming to infer the location of spaces in a string
-    without spaces."""
-
-    # Find the best match for the i first characters, assuming cost has
-    # been built for the i-1 first characters.
-    # Returns a pair (match_cost, match_length).
-    def best_match(i):
-        candidates = enumerate(reversed(cost[max(0, i - maxword):i]))
-        return min((c + wordcost.get(s[i - k - 1:i], 9e999), k + 1) for k, c in candidates)
-
-    # Build the cost array.
-    cost = [0]
-    for i in range(1, len(s) + 1):
-        c, k = best_match(i)
-        cost.append(c)
-
-    # Backtrack to recover the minimal-cost string.
-    out = []
-    i = len(s)
-    while i > 0:
-        c, k = best_match(i)
-        assert c == cost[i]
-        out.append(s[i - k:i])
-        i -= k
-
-    return reversed(out)
-
-
-def word_analysis(passwords):
+    """按词库代价对不含空格的字符串做最小代价切分，动态规划见 lexicon.Lexicon.infer_spaces"""
+    return load_lexicon().infer_spaces(s)
+
+
+def word_analysis(passwords, weights=None):
+    # weights 为去重口令的出现次数（见 password_structure.unique_counts），缺省时每条计 1
     word_lib = {}
+    if weights is None:
+        weights = [1] * len(passwords)
 
-    for password in passwords:
+    for password, weight in zip(passwords, weights):
         # 只提取口令中的英文
         chars = re.split(r'[^A-Za-z]', password)
         while '' in chars:
@@ -78,7 +66,7 @@ def word_analysis(passwords):
         for char in chars:
             word_list = infer_spaces(char)
             for word in word_list:
-                word_lib[word] = word_lib.get(word, 0) + 1
+                word_lib[word] = word_lib.get(word, 0) + weight
 
     # 对得到的字典排序并输出
     sorted_lib = sorted(word_lib.items(), key = lambda kv:(kv[1], kv[0]), reverse=True) 
@@ -98,8 +86,12 @@ def word_analysis(passwords):
 
 
 def main():
-    passwords = init_data()
-    sorted_lib = word_analysis(passwords)
+    with stage('analysis_task_3.load') as st:
+        passwords = init_data()
+        st.add(len(passwords))
+    with stage('analysis_task_3.word', items=len(passwords)):
+        uniques, counts = unique_counts(passwords)
+        sorted_lib = word_analysis(uniques, counts)
 
 
 def show():
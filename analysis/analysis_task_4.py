@@ -1,35 +1,21 @@
+import os
 import pickle
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+from password_structure import ASCII_CLASSES, structure, unique_counts
 
 FILE_NAME = 'csdn'
 # FILE_NAME = 'yahoo'
+FILE_NAME = os.getenv('ANALYSIS_DATASET', FILE_NAME).lower()
 
 
 def getRule(line):
-    indexes = []
-    for char in line:  
-        if char >= '0' and char <= '9':
-            char_index = 'D'
-        elif (char >= 'a' and char <= 'z') or (char >= 'A' and char <= 'Z'):
-            char_index  = 'L'
-        else:
-            char_index = 'S'
-        indexes.append(char_index)
-
     # generate rule
     # 123ab32a -> [(D, 3), (L, 2), (D, 2), (L, 1), frequency]
-    rule = []
-    current = indexes[0]
-    count = 0
-    indexes.append('\n')
-    string = ''
-    for index in indexes:
-        if index == current:
-            count += 1
-        else:
-            rule.append((current, count))
-            string += current + str(count)
-            current, count = index, 1
-    
+    string, spans = structure(line, ASCII_CLASSES)
+    rule = [(char_index, end - start) for char_index, start, end in spans]
     return rule, string
     
 
@@ -38,9 +24,12 @@ def main():
         lines = pickle.load(f)[0]
 
     rule_lib = {}
-    for line in lines:
-        rule, key = getRule(line)
-        rule_lib[key] = rule_lib.get(key, 0) + 1
+    with stage('analysis_task_4.rules', items=len(lines)):
+        # 每个不同口令只切分一次，按出现次数累加
+        uniques, counts = unique_counts(lines)
+        for line, count in zip(uniques, counts):
+            rule, key = getRule(line)
+            rule_lib[key] = rule_lib.get(key, 0) + count
     sorted_list = sorted(rule_lib.items(), key = lambda kv:(kv[1], kv[0]), reverse=True)
 
     rules = []
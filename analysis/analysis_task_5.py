@@ -1,60 +1,42 @@
+import os
 import pickle
 import re
-from math import log
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage, timed
+from password_structure import unique_counts
 
 FILE_NAME = 'csdn'
 # FILE_NAME = 'yahoo'
+FILE_NAME = os.getenv('ANALYSIS_DATASET', FILE_NAME).lower()
+
+LIB_PATHS = {
+    'eng': './lib/word_lib.txt',
+    'py': './lib/pinyin_lib.txt',
+}
 
-lib_path = './lib/word_lib.txt'
-# Build a cost dictionary, assuming Zipf's law and cost = -math.log(probability).
-eng_words = open(lib_path, encoding='utf-8').read().split()
-eng_wordcost = dict((k, log((i + 1) * log(len(eng_words)))) for i, k in enumerate(eng_words))
-eng_maxword = max(len(x) for x in eng_words)
 
-lib_path = './lib/pinyin_lib.txt'
-py_words = open(lib_path, encoding='utf-8').read().split()
-py_wordcost = dict((k, log((i + 1) * log(len(py_words)))) for i, k in enumerate(py_words))
-py_maxword = max(len(x) for x in py_words)
+def load_lexicon(tag):
+    """首次用到某个词库时加载其预编译代价表（见 lexicon.py）"""
+    from lexicon import get_lexicon
+    return get_lexicon(LIB_PATHS[tag])
 
 
 # Vocabulary extraction
+@timed('analysis_task_5.infer_spaces')
 def infer_spaces(s, tag):
-    """Uses dynamic programming to infer the location of spaces in a string
-    without spaces."""
-
-    # Find the best match for the i first characters, assuming cost has
-    # been built for the i-1 first characters.
-    # Returns a pair (match_cost, match_length).
-    def best_match(i):
-        if tag == 'eng':
-            candidates = enumerate(reversed(cost[max(0, i - eng_maxword):i]))
-            return min((c + eng_wordcost.get(s[i - k - 1:i], 9e999), k + 1) for k, c in candidates)
-        else:
-            candidates = enumerate(reversed(cost[max(0, i - py_maxword):i]))
-            return min((c + py_wordcost.get(s[i - k - 1:i], 9e999), k + 1) for k, c in candidates)
-
-    # Build the cost array.
-    cost = [0]
-    for i in range(1, len(s) + 1):
-        c, k = best_match(i)
-        cost.append(c)
-
-    # Backtrack to recover the minimal-cost string.
-    out = []
-    i = len(s)
-    while i > 0:
-        c, k = best_match(i)
-        assert c == cost[i]
-        out.append(s[i - k:i])
-        i -= k
-
-    return reversed(out)
-
-
-def word_analysis(passwords, tag):
+    """按词库代价对不含空格的字符串做最小代价切分，动态规划见 lexicon.Lexicon.infer_spaces"""
+    return load_lexicon('eng' if tag == 'eng' else 'py').infer_spaces(s)
+
+
+def word_analysis(passwords, tag, weights=None):
+    # weights 为去重口令的出现次数（见 password_structure.unique_counts），缺省时每条计 1
     word_lib = {}
+    if weights is None:
+        weights = [1] * len(passwords)
 
-    for password in passwords:
+    for password, weight in zip(passwords, weights):
         # 只提取口令中的英文
         chars = re.split(r'[^A-Za-z]', password)
         while '' in chars:
@@ -63,7 +45,7 @@ def word_analysis(passwords, tag):
         for char in chars:
             word_list = infer_spaces(char, tag)
             for word in word_list:
-                word_lib[word] = word_lib.get(word, 0) + 1
+                word_lib[word] = word_lib.get(word, 0) + weight
 
     # 对得到的字典排序并输出
     sorted_lib = sorted(word_lib.items(), key = lambda kv:(kv[1], kv[0]), reverse=True) 
@@ -76,8 +58,12 @@ def main():
     with open('../data/data_' + FILE_NAME + '.pkl', 'rb') as f:
         passwords = pickle.load(f)[0]
 
-    pinyin_lib = word_analysis(passwords, tag='py')
-    word_lib = word_analysis(passwords, tag='eng')
+    # 两个词库共用一次去重
+    uniques, counts = unique_counts(passwords)
+    with stage('analysis_task_5.pinyin', items=len(passwords)):
+        pinyin_lib = word_analysis(uniques, tag='py', weights=counts)
+    with stage('analysis_task_5.word', items=len(passwords)):
+        word_lib = word_analysis(uniques, tag='eng', weights=counts)
 
     total = 0
     total_lib = pinyin_lib + word_lib
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+有界内存的高频项统计（Space-Saving）。
+
+最多保留 capacity 个计数器：新项在表满时替换当前最小计数项，并继承其计数作为误差上界。
+对任一项，估计值 count 满足 真实值 <= count <= 真实值 + error，且 error <= total / capacity；
+真实频次超过 total / capacity 的项一定在表中。两个摘要可以合并（Agarwal et al. 2012），
+因此各数据集分别统计后即可得到合并结果，不必重新扫描。
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class SpaceSaving:
+    """与 Counter 的 update / most_common 用法一致，额外提供 error() 与 merge()"""
+
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity 必须为正整数")
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        # 惰性最小堆：(count, item)，出堆时与 counts 对照丢弃过期项
+        self._heap: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.counts
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(cnt, item) for item, cnt in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            cnt, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == cnt:
+                return cnt, item
+
+    def add(self, item: str, n: int = 1) -> None:
+        self.total += n
+        counts = self.counts
+        if item in counts:
+            counts[item] += n
+        elif len(counts) < self.capacity:
+            counts[item] = n
+            self.errors[item] = 0
+        else:
+            floor, victim = self._pop_min()
+            del counts[victim]
+            del self.errors[victim]
+            counts[item] = floor + n
+            self.errors[item] = floor
+        heapq.heappush(self._heap, (counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def min_count(self) -> int:
+        """表满时未被跟踪项的频次上界，未满时为 0"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def error(self, item: str) -> int:
+        # 已跟踪的项直接查表，只有未跟踪的项才需要 O(k) 的 min_count()
+        err = self.errors.get(item)
+        return err if err is not None else self.min_count()
+
+    def error_bound(self) -> float:
+        return self.total / self.capacity
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        items = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)
+        return items if n is None else items[:n]
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """返回合并后的新摘要（容量取两者较大值），误差上界相加"""
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        floor_a, floor_b = self.min_count(), other.min_count()
+        combined: Dict[str, Tuple[int, int]] = {}
+        # 按插入顺序遍历（先 self 再 other 的新项），nlargest 是稳定的，平局时结果不随字符串 hash 变化
+        for item in {**self.counts, **other.counts}:
+            count = self.counts.get(item, floor_a) + other.counts.get(item, floor_b)
+            error = self.errors.get(item, floor_a) + other.errors.get(item, floor_b)
+            combined[item] = (count, error)
+        top = heapq.nlargest(merged.capacity, combined.items(), key=lambda kv: kv[1][0])
+        for item, (count, error) in top:
+            merged.counts[item] = count
+            merged.errors[item] = error
+        merged.total = self.total + other.total
+        merged._rebuild_heap()
+        return merged
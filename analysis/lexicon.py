@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+预编译的分词词库：按 Zipf 定律计算的代价表，编译一次后以内存映射方式加载。
+
+词库文本（lib/word_lib.txt、lib/pinyin_lib.txt）第 i 个词的代价为 log((i + 1) * log(N))，
+与 analysis_task_3/5 原先构造的 dict 完全一致（重复词以最后一次出现为准）。编译结果写入
+lib/compiled/<词库名>.{words,costs}.npy 与 .json：词按字节序排序成定长数组，代价按同一顺序存放，
+查询时用 np.searchsorted 二分。源文件变化（大小或修改时间不同）时自动重新编译。
+
+np.load(mmap_mode="r") 加载几乎不耗时，多个进程读取同一词库时共享页缓存，不必各自构造 12 万项的 dict。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from math import log
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+LIB_DIR = Path(__file__).resolve().parent / "lib"
+COMPILED_DIR = LIB_DIR / "compiled"
+# 与原实现的 wordcost.get(word, 9e999) 一致（9e999 即 inf）
+MISSING_COST = float("inf")
+# 子串代价与切词结果的缓存上限：口令中的字母串高度重复，命中后无需再做动态规划
+CACHE_SIZE = 1 << 20
+
+
+def _source_signature(source: Path) -> Dict[str, int]:
+    stat = source.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _replace_atomic(path: Path, write) -> None:
+    # 先写同目录下的临时文件再 os.replace：其它进程要么看到旧文件，要么看到完整的新文件
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def compile_lexicon(source: Union[str, Path], output_dir: Path = COMPILED_DIR) -> Path:
+    """把词库文本编译为排序后的定长字节数组 + 代价数组，返回 meta 文件路径"""
+    source = Path(source)
+    words = source.read_text(encoding="utf-8").split()
+    total = len(words)
+    # 与 dict((k, cost_i) ...) 语义一致：重复词保留最后一次出现的代价
+    costs: Dict[str, float] = {}
+    for i, word in enumerate(words):
+        costs[word] = log((i + 1) * log(total))
+    maxword = max(len(word) for word in words)
+
+    keys = sorted(costs, key=lambda word: word.encode("utf-8"))
+    encoded = np.array([word.encode("utf-8") for word in keys])
+    values = np.array([costs[word] for word in keys], dtype=np.float64)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = output_dir / source.stem
+    _replace_atomic(Path(f"{stem}.words.npy"), lambda f: np.save(f, encoded))
+    _replace_atomic(Path(f"{stem}.costs.npy"), lambda f: np.save(f, values))
+    # meta 最后替换：读到新 meta 时两个数组都已就位
+    meta_path = Path(f"{stem}.json")
+    meta = {"source": source.name, "count": len(keys), "maxword": maxword, **_source_signature(source)}
+    _replace_atomic(meta_path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+    return meta_path
+
+
+class Lexicon:
+    """只读的词 -> 代价表，支持批量查询与基于动态规划的切词"""
+
+    def __init__(self, words: np.ndarray, costs: np.ndarray, maxword: int) -> None:
+        self.words = words
+        self.costs = costs
+        self.maxword = maxword
+        self.width = words.dtype.itemsize
+        self._cache: Dict[str, float] = {}
+        self._segments: Dict[str, List[str]] = {}
+
+    @classmethod
+    def load(cls, source: Union[str, Path], output_dir: Path = COMPILED_DIR) -> "Lexicon":
+        source = Path(source)
+        stem = output_dir / source.stem
+        meta_path = Path(f"{stem}.json")
+        meta: Optional[dict] = None
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            signature = _source_signature(source)
+            if any(meta.get(key) != value for key, value in signature.items()):
+                meta = None
+        if meta is None:
+            compile_lexicon(source, output_dir)
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        words = np.load(f"{stem}.words.npy", mmap_mode="r")
+        costs = np.load(f"{stem}.costs.npy", mmap_mode="r")
+        return cls(words, costs, meta["maxword"])
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def lookup(self, keys: Iterable[str]) -> Dict[str, float]:
+        """批量查询，返回 {词: 代价}；不在词库中的词不出现在结果里"""
+        keys = [key for key in keys if len(key.encode("utf-8")) <= self.width]
+        if not keys:
+            return {}
+        encoded = np.array([key.encode("utf-8") for key in keys], dtype=self.words.dtype)
+        idx = np.searchsorted(self.words, encoded)
+        idx[idx == len(self.words)] = 0
+        found = self.words[idx] == encoded
+        costs = self.costs[idx]
+        return {key: float(cost) for key, cost, hit in zip(keys, costs, found) if hit}
+
+    def infer_spaces(self, s: str) -> List[str]:
+        """Uses dynamic programming to infer the location of spaces in a string
+        without spaces."""
+        segments = self._segments.get(s)
+        if segments is None:
+            if len(self._segments) >= CACHE_SIZE:
+                self._segments.clear()
+            segments = self._segments[s] = self._infer_spaces(s)
+        return segments
+
+    def _infer_spaces(self, s: str) -> List[str]:
+        maxword = self.maxword
+        # 未缓存的子串一次批量查询（未命中记为 MISSING_COST），动态规划只查本地 dict
+        wordcost = self._cache
+        substrings = {s[j:i] for i in range(1, len(s) + 1) for j in range(max(0, i - maxword), i)}
+        pending = [key for key in substrings if key not in wordcost]
+        if pending:
+            if len(wordcost) + len(pending) > CACHE_SIZE:
+                wordcost.clear()
+                pending = list(substrings)
+            found = self.lookup(pending)
+            for key in pending:
+                wordcost[key] = found.get(key, MISSING_COST)
+
+        # Find the best match for the i first characters, assuming cost has
+        # been built for the i-1 first characters.
+        # Returns a pair (match_cost, match_length).
+        def best_match(i):
+            candidates = enumerate(reversed(cost[max(0, i - maxword):i]))
+            return min((c + wordcost.get(s[i - k - 1:i], MISSING_COST), k + 1) for k, c in candidates)
+
+        # Build the cost array.
+        cost = [0]
+        for i in range(1, len(s) + 1):
+            c, k = best_match(i)
+            cost.append(c)
+
+        # Backtrack to recover the minimal-cost string.
+        out = []
+        i = len(s)
+        while i > 0:
+            c, k = best_match(i)
+            assert c == cost[i]
+            out.append(s[i - k:i])
+            i -= k
+
+        return out[::-1]
+
+
+_LOADED: Dict[str, Lexicon] = {}
+
+
+def get_lexicon(source: Union[str, Path]) -> Lexicon:
+    """进程内按路径缓存的 Lexicon.load"""
+    key = os.path.abspath(source)
+    if key not in _LOADED:
+        _LOADED[key] = Lexicon.load(source)
+    return _LOADED[key]
+
+
+if __name__ == "__main__":
+    for name in ("word_lib.txt", "pinyin_lib.txt"):
+        print(f"编译：{compile_lexicon(LIB_DIR / name)}")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+多模式子串匹配（Aho-Corasick 自动机）。
+
+对一组 token 建立自动机后，每条文本只需线性扫描一次即可报告其中出现的全部 token
+（含重叠与嵌套，如 "ilovejohn88" 中的 "love"、"john"）。安装了 pyahocorasick 时使用其
+C 实现，否则回退到纯 Python 实现，两者输出一致。
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import ahocorasick
+except ImportError:  # 可选依赖
+    ahocorasick = None
+
+
+class TokenMatcher:
+    """Aho-Corasick 多模式匹配器；iter_matches() 产出 (起始下标, token)"""
+
+    def __init__(self, tokens: Iterable[str], use_native: bool = True) -> None:
+        self.tokens = sorted({token for token in tokens if token})
+        self._native = None
+        if use_native and ahocorasick is not None and self.tokens:
+            automaton = ahocorasick.Automaton()
+            for token in self.tokens:
+                automaton.add_word(token, token)
+            automaton.make_automaton()
+            self._native = automaton
+        else:
+            self._build()
+
+    def _build(self) -> None:
+        # 状态 0 为根；goto[s] 为转移表，fail[s] 为失配指针，output[s] 为在 s 结束的 token
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[str, ...]] = [()]
+        for token in self.tokens:
+            state = 0
+            for ch in token:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = nxt
+            self.output[state] = (token,)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                # 合并后缀链上的输出，扫描时无需再沿 fail 回溯
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        if not self.tokens:
+            return
+        if self._native is not None:
+            for end, token in self._native.iter(text):
+                yield end - len(token) + 1, token
+            return
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for idx, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for token in output[state]:
+                yield idx - len(token) + 1, token
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        return list(self.iter_matches(text))
+
+
+def covered_length(matches: Iterable[Tuple[int, str]]) -> int:
+    """匹配区间的并集长度（重叠部分只计一次）"""
+    total = 0
+    reach = 0
+    for start, token in sorted(matches):
+        end = start + len(token)
+        if end <= reach:
+            continue
+        total += end - max(start, reach)
+        reach = end
+    return total
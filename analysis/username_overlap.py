@@ -6,6 +6,7 @@
 1. analysis/results/username_overlap_<dataset>.csv - 子串出现次数与覆盖率
 2. analysis/results/username_overlap_<dataset>.html - Top-N 共享子串占比
 3. pcfg_advance/lib/username_tokens_<dataset>.txt - PCFG 可直接引用的 token 概率表
+4. analysis/results/username_substring_<dataset>.csv - 口令中包含的用户名 token（--substring）
 """
 
 from __future__ import annotations
@@ -13,24 +14,42 @@ from __future__ import annotations
 import argparse
 import csv
 import html
+import io
+import multiprocessing
 import re
+import sys
 from collections import Counter, defaultdict
-from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from instrumentation import stage, timed  # noqa: E402
+from heavy_hitters import SpaceSaving  # noqa: E402
+from token_matcher import TokenMatcher, covered_length  # noqa: E402
+
 DATA_DIR = ROOT / "data"
 RESULTS_DIR = ROOT / "analysis" / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 TOKEN_OUTPUT_DIR = ROOT / "pcfg_advance" / "lib"
 TOKEN_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+SOURCES = [
+    ("csdn", DATA_DIR / "csdn.txt"),
+    ("yahoo", DATA_DIR / "yahoo.txt"),
+]
+
+TokenCounter = Union[Counter, SpaceSaving]
+
 TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{2,}|[A-Za-z]\d+|\d+[A-Za-z]+")
+SPLIT_PATTERN = re.compile(r"[\W_]+")
+# 分词缓存容量：口令与用户名重复度高，邮箱域名更是集中在少数几个
+TOKEN_CACHE_SIZE = 1 << 18
+DOMAIN_CACHE_SIZE = 1 << 12
 
 
-@dataclass
-class Record:
+class Record(NamedTuple):
     dataset: str
     username: str
     password: str
@@ -67,60 +86,126 @@ def parse_record(raw: str, dataset: str) -> Record | None:
     return None
 
 
-def load_records() -> List[Record]:
-    records: List[Record] = []
-    sources = [
-        ("csdn", DATA_DIR / "csdn.txt"),
-        ("yahoo", DATA_DIR / "yahoo.txt"),
-    ]
-    for dataset, path in sources:
+def iter_records(datasets: Optional[Iterable[str]] = None) -> Iterator[Record]:
+    """逐行流式读取，datasets 为空时读取全部数据源"""
+    wanted = set(datasets) if datasets is not None else None
+    for dataset, path in SOURCES:
+        if wanted is not None and dataset not in wanted:
+            continue
         if not path.exists():
             continue
         with path.open(encoding="utf-8") as fh:
             for raw in fh:
                 rec = parse_record(raw, dataset)
                 if rec:
-                    records.append(rec)
-    return records
+                    yield rec
 
 
-def tokenize(text: str) -> Set[str]:
+def load_records() -> List[Record]:
+    return list(iter_records())
+
+
+def chunk_ranges(path: Path, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """把文件按约 chunk_bytes 切成若干 [start, end) 字节区间，边界对齐到行首"""
+    size = path.stat().st_size
+    bounds = [0]
+    with path.open("rb") as fh:
+        while bounds[-1] + chunk_bytes < size:
+            fh.seek(bounds[-1] + chunk_bytes)
+            fh.readline()
+            pos = fh.tell()
+            if pos >= size:
+                break
+            bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_chunk_records(dataset: str, path: Path, start: int, end: int) -> Iterator[Record]:
+    with path.open("rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    # 与 iter_records 的文本模式一致：utf-8 解码并统一换行符
+    for raw in io.StringIO(data.decode("utf-8"), newline=None):
+        rec = parse_record(raw, dataset)
+        if rec:
+            yield rec
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokenize(text: str) -> FrozenSet[str]:
     tokens: Set[str] = set()
     cleaned = text.strip()
     if not cleaned:
-        return tokens
+        return frozenset()
     tokens.add(cleaned)
-    for chunk in re.split(r"[\W_]+", cleaned):
+    for chunk in SPLIT_PATTERN.split(cleaned):
         if chunk:
             tokens.add(chunk)
     for match in TOKEN_PATTERN.finditer(cleaned):
         tokens.add(match.group(0))
+    return frozenset(tokens)
+
+
+def _candidate_tokens(candidates: Iterable[str]) -> Set[str]:
+    tokens: Set[str] = set()
+    # 去重后再分词，同一条记录中重复出现的候选只处理一次
+    for candidate in dict.fromkeys(candidates):
+        if candidate:
+            tokens |= tokenize(candidate)
     return tokens
 
 
+def _split_candidates(candidate: str) -> List[str]:
+    # 对邮箱 local 的拆分（如 john.doe -> john, doe）
+    return candidate.replace("@", ".").split(".")
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def domain_tokens(domain: str) -> FrozenSet[str]:
+    """邮箱域名的 token（yahoo.com -> yahoo, com, yahoo.com），按域名缓存"""
+    if not domain:
+        return frozenset()
+    domain_base = domain.split(".")[0]
+    return frozenset(_candidate_tokens([domain_base, domain, *_split_candidates(domain)]))
+
+
 def username_tokens(username: str, email: str) -> Set[str]:
-    tokens = set()
     candidates = [username]
+    domain = ""
     if email:
         local, _, domain = email.partition("@")
-        domain_base = domain.split(".")[0] if domain else ""
-        candidates.extend([local, domain_base, domain])
-    for candidate in candidates:
-        tokens.update(tokenize(candidate))
-    # 对邮箱 local 的拆分（如 john.doe -> john, doe）
-    split_candidates: List[str] = []
-    for candidate in candidates:
-        split_candidates.extend(candidate.replace("@", ".").split("."))
-    for candidate in split_candidates:
-        if candidate:
-            tokens.update(tokenize(candidate))
-    return {tok for tok in tokens if tok}
+        candidates.append(local)
+    pieces = [piece for candidate in candidates for piece in _split_candidates(candidate)]
+    tokens = _candidate_tokens(candidates + pieces)
+    tokens |= domain_tokens(domain)
+    return tokens
 
 
-def password_tokens(password: str) -> Set[str]:
+def password_tokens(password: str) -> FrozenSet[str]:
     return tokenize(password)
 
 
+def token_cache_stats() -> Counter:
+    stats = Counter()
+    for name, func in (("tokenize", tokenize), ("domain", domain_tokens)):
+        info = func.cache_info()
+        stats[f"{name}_hits"] = info.hits
+        stats[f"{name}_misses"] = info.misses
+    return stats
+
+
+def format_cache_stats(stats: Counter) -> str:
+    parts = []
+    for name in ("tokenize", "domain"):
+        hits, misses = stats[f"{name}_hits"], stats[f"{name}_misses"]
+        total = hits + misses
+        rate = hits / total * 100 if total else 0.0
+        parts.append(f"{name} {rate:.1f}% ({hits}/{total})")
+    return "token_cache_hit_rate: " + ", ".join(parts)
+
+
+@timed("username_overlap.levenshtein")
 def levenshtein(a: str, b: str) -> int:
     if a == b:
         return 0
@@ -144,11 +229,113 @@ def levenshtein(a: str, b: str) -> int:
     return prev[-1]
 
 
-def run_analysis(records: List[Record]) -> Tuple[Counter, Counter]:
-    counts = Counter()
-    token_counter = Counter()
-
+def find_substrings(tokens: Iterable[str], text: str) -> List[Tuple[int, str]]:
+    """各 token 在 text 中的全部出现位置（含重叠），与 TokenMatcher.find_all 的结果集合一致"""
+    matches = []
+    for tok in tokens:
+        start = text.find(tok)
+        while start != -1:
+            matches.append((start, tok))
+            start = text.find(tok, start + 1)
+    return matches
+
+
+class SubstringOverlap:
+    """口令中包含的用户名 token（子串而非整段相等）
+
+    dictionary 为空时每条记录只有少量用户名 token，直接用 str.find 查找（建自动机反而更慢）；
+    否则使用全局高频 token 词典建一次 Aho-Corasick 自动机线性扫描，结果再与该记录的用户名 token 求交。
+    """
+
+    def __init__(self, min_len: int = 3, dictionary: Optional[List[str]] = None) -> None:
+        self.min_len = min_len
+        self.matcher = TokenMatcher(dictionary) if dictionary else None
+        self.token_counter: Counter = Counter()
+        self.length_counter: Counter = Counter()
+        self.records = 0
+        self.matched = 0
+        self.password_chars = 0
+        self.covered_chars = 0
+
+    def update(self, u_lower: Set[str], password: str) -> None:
+        tokens = {tok for tok in u_lower if len(tok) >= self.min_len}
+        password = password.lower()
+        self.records += 1
+        self.password_chars += len(password)
+        if not tokens:
+            return
+        if self.matcher is None:
+            matches = find_substrings(tokens, password)
+        else:
+            matches = [(start, tok) for start, tok in self.matcher.iter_matches(password) if tok in tokens]
+        if not matches:
+            return
+        self.matched += 1
+        self.covered_chars += covered_length(matches)
+        contained = {tok for _, tok in matches}
+        self.token_counter.update(sorted(contained))
+        self.length_counter.update(len(tok) for tok in contained)
+
+    def merge(self, other: "SubstringOverlap") -> "SubstringOverlap":
+        merged = SubstringOverlap(self.min_len)
+        merged.token_counter = self.token_counter + other.token_counter
+        merged.length_counter = self.length_counter + other.length_counter
+        for attr in ("records", "matched", "password_chars", "covered_chars"):
+            setattr(merged, attr, getattr(self, attr) + getattr(other, attr))
+        return merged
+
+    def write_csv(self, dataset: str) -> Path:
+        suffix = "" if dataset == "all" else f"_{dataset}"
+        csv_path = RESULTS_DIR / f"username_substring{suffix}.csv"
+        total = self.records or 1
+        with csv_path.open("w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["token", "length", "count", "coverage_percent"])
+            for token, cnt in self.token_counter.most_common():
+                writer.writerow([token, len(token), cnt, f"{cnt / total * 100:.2f}"])
+        return csv_path
+
+    def print_summary(self) -> None:
+        total = self.records or 1
+        chars = self.password_chars or 1
+        print(f"substring_match: {self.matched} ({self.matched / total * 100:.2f}%)")
+        print(f"substring_char_coverage: {self.covered_chars / chars * 100:.2f}%")
+        lengths = ", ".join(f"{length}:{cnt}" for length, cnt in sorted(self.length_counter.items()))
+        print(f"substring_token_lengths: {lengths}")
+
+
+def top_username_tokens(records: Iterable[Record], limit: int, min_len: int = 3) -> List[str]:
+    """全局用户名 token 词典（按出现记录数取前 limit 个）"""
+    counter = Counter()
     for record in records:
+        counter.update(
+            {tok.lower() for tok in username_tokens(record.username, record.email) if len(tok) >= min_len}
+        )
+    return [token for token, _ in counter.most_common(limit)]
+
+
+def new_token_counter(capacity: int = 0) -> TokenCounter:
+    """capacity 为 0 时精确计数，否则使用容量为 capacity 的 Space-Saving 摘要"""
+    return SpaceSaving(capacity) if capacity else Counter()
+
+
+def merge_token_counters(a: TokenCounter, b: TokenCounter) -> TokenCounter:
+    if isinstance(a, SpaceSaving):
+        return a.merge(b)
+    return a + b
+
+
+class OverlapAccumulator:
+    """单个数据集的复用统计，逐条记录更新，可与其它数据集的结果合并"""
+
+    def __init__(self, substring: Optional[SubstringOverlap] = None, token_capacity: int = 0) -> None:
+        self.counts: Counter = Counter()
+        self.token_counter: TokenCounter = new_token_counter(token_capacity)
+        self.substring = substring
+        # 分词缓存命中统计（多进程时由各子进程带回）
+        self.cache_stats: Counter = Counter()
+
+    def update(self, record: Record) -> None:
         u_tokens = username_tokens(record.username, record.email)
         p_tokens = password_tokens(record.password)
         u_lower = {t.lower() for t in u_tokens}
@@ -169,33 +356,119 @@ def run_analysis(records: List[Record]) -> Tuple[Counter, Counter]:
                 if lev_match:
                     break
 
+        counts = self.counts
         counts["pairs_total"] += 1
+        if self.substring is not None:
+            self.substring.update(u_lower, record.password)
 
         if exact:
             counts["exact_match"] += 1
         if lower:
             counts["lower_match"] += 1
-            token_counter.update(u_lower & p_lower)
+            # 排序后再计数：集合遍历顺序随字符串 hash 变化，会影响 Space-Saving 的淘汰与平局顺序
+            self.token_counter.update(sorted(u_lower & p_lower))
         if lev_match:
             counts["lev1_match"] += 1
 
-    return counts, token_counter
+    def merge(self, other: "OverlapAccumulator") -> "OverlapAccumulator":
+        merged = OverlapAccumulator()
+        merged.counts = self.counts + other.counts
+        merged.cache_stats = self.cache_stats + other.cache_stats
+        merged.token_counter = merge_token_counters(self.token_counter, other.token_counter)
+        if self.substring is not None and other.substring is not None:
+            merged.substring = self.substring.merge(other.substring)
+        return merged
+
+
+# 子进程内按数据集缓存的词典自动机，每个进程只构建一次
+_WORKER_MATCHERS: Dict[str, TokenMatcher] = {}
+
+
+def _worker_substring(dataset: str, substring_args: Tuple[int, Optional[List[str]]]) -> SubstringOverlap:
+    min_len, dictionary = substring_args
+    substring = SubstringOverlap(min_len)
+    if dictionary:
+        matcher = _WORKER_MATCHERS.get(dataset)
+        if matcher is None:
+            matcher = _WORKER_MATCHERS[dataset] = TokenMatcher(dictionary)
+        substring.matcher = matcher
+    return substring
+
+
+def _analyze_chunk(
+    task: Tuple[str, str, int, int, Optional[Tuple[int, Optional[List[str]]]], int]
+) -> Tuple[str, OverlapAccumulator]:
+    dataset, path, start, end, substring_args, token_capacity = task
+    substring = _worker_substring(dataset, substring_args) if substring_args else None
+    acc = OverlapAccumulator(substring, token_capacity)
+    before = token_cache_stats()
+    for record in iter_chunk_records(dataset, Path(path), start, end):
+        acc.update(record)
+    acc.cache_stats = token_cache_stats() - before
+    if acc.substring is not None:
+        # 自动机只在子进程内使用，不随结果回传
+        acc.substring.matcher = None
+    return dataset, acc
+
+
+def run_parallel(
+    datasets: List[str],
+    substring_args: Dict[str, Optional[Tuple[int, Optional[List[str]]]]],
+    token_capacity: int,
+    workers: int,
+) -> Dict[str, OverlapAccumulator]:
+    """按行对齐的字节区间把各数据文件分块，多进程统计后按文件顺序合并
+
+    精确计数模式下合并结果与串行一致（Counter 相加保持首次出现顺序）。
+    """
+    tasks = []
+    for dataset, path in SOURCES:
+        if dataset not in datasets or not path.exists():
+            continue
+        chunk_bytes = max(1 << 20, min(64 << 20, path.stat().st_size // (workers * 4) + 1))
+        for start, end in chunk_ranges(path, chunk_bytes):
+            tasks.append((dataset, str(path), start, end, substring_args.get(dataset), token_capacity))
+
+    merged: Dict[str, OverlapAccumulator] = {}
+    methods = multiprocessing.get_all_start_methods()
+    # fork 使子进程继承相同的字符串哈希种子，集合遍历顺序与串行一致
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ctx.Pool(workers) as pool:
+        for dataset, acc in pool.imap(_analyze_chunk, tasks):
+            merged[dataset] = merged[dataset].merge(acc) if dataset in merged else acc
+    return merged
+
+
+def run_analysis(
+    records: Iterable[Record],
+    substring: Optional[SubstringOverlap] = None,
+    token_capacity: int = 0,
+) -> Tuple[Counter, TokenCounter]:
+    acc = OverlapAccumulator(substring, token_capacity)
+    for record in records:
+        acc.update(record)
+    return acc.counts, acc.token_counter
 
 
-def write_csv(dataset: str, counts: Counter, token_counter: Counter) -> Path:
+def write_csv(dataset: str, counts: Counter, token_counter: TokenCounter) -> Path:
     suffix = "" if dataset == "all" else f"_{dataset}"
     csv_path = RESULTS_DIR / f"username_overlap{suffix}.csv"
     with csv_path.open("w", newline="", encoding="utf-8") as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(["token", "count", "coverage_percent"])
+        # 只有 Space-Saving 摘要才输出 error 列（计数的高估上界），精确计数时保持原有的三列
+        approximate = isinstance(token_counter, SpaceSaving)
+        writer.writerow(["token", "count", "coverage_percent"] + (["error"] if approximate else []))
         total_pairs = counts["pairs_total"] or 1
         for token, cnt in token_counter.most_common():
             coverage = cnt / total_pairs * 100
-            writer.writerow([token, cnt, f"{coverage:.2f}"])
+            row = [token, cnt, f"{coverage:.2f}"]
+            if approximate:
+                row.append(token_counter.error(token))
+            writer.writerow(row)
     return csv_path
 
 
-def write_html(dataset: str, counts: Counter, token_counter: Counter) -> Path:
+def write_html(dataset: str, counts: Counter, token_counter: TokenCounter) -> Path:
     suffix = "" if dataset == "all" else f"_{dataset}"
     html_path = RESULTS_DIR / f"username_overlap{suffix}.html"
     top_tokens = token_counter.most_common(10)
@@ -247,7 +520,7 @@ def write_html(dataset: str, counts: Counter, token_counter: Counter) -> Path:
 def write_token_file(
     dataset: str,
     counts: Counter,
-    token_counter: Counter,
+    token_counter: TokenCounter,
     coverage_threshold: float,
     max_tokens: int,
 ) -> Path:
@@ -275,7 +548,7 @@ def write_token_file(
     return output_path
 
 
-def print_summary(dataset: str, counts: Counter) -> None:
+def print_summary(dataset: str, counts: Counter, token_counter: Optional[TokenCounter] = None) -> None:
     total = counts.get("pairs_total", 0) or 1
     print(f"=== {dataset} ===")
     print(f"pairs_total: {counts.get('pairs_total',0)}")
@@ -283,6 +556,11 @@ def print_summary(dataset: str, counts: Counter) -> None:
         value = counts.get(key, 0)
         pct = value / total * 100 if total else 0
         print(f"{key}: {value} ({pct:.2f}%)")
+    if isinstance(token_counter, SpaceSaving):
+        print(
+            f"tracked_tokens: {len(token_counter)}/{token_counter.capacity}, "
+            f"error_bound: {token_counter.error_bound():.1f} (total {token_counter.total})"
+        )
 
 
 def parse_args() -> argparse.Namespace:
@@ -306,41 +584,104 @@ def parse_args() -> argparse.Namespace:
         default=200,
         help="写入 token 文件的最大条数",
     )
+    parser.add_argument(
+        "--substring",
+        action="store_true",
+        help="额外统计口令中作为子串出现的用户名 token（默认逐个 token 做普通子串查找）",
+    )
+    parser.add_argument(
+        "--substring-min-len",
+        type=int,
+        default=3,
+        help="参与子串匹配的最短 token 长度（默认 3）",
+    )
+    parser.add_argument(
+        "--substring-dict",
+        type=int,
+        default=0,
+        help="N > 0 时用全局前 N 个用户名 token 建一个 Aho-Corasick 自动机扫描口令（默认 0：逐条记录普通子串查找）",
+    )
+    parser.add_argument(
+        "--max-tracked-tokens",
+        type=int,
+        default=0,
+        help="以 Space-Saving 摘要最多跟踪 N 个共享 token，内存有界并输出误差上界（默认 0：精确计数）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="多进程分块统计的进程数（默认 1：串行）",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    records = load_records()
-    if not records:
+    datasets = args.dataset or ["all"]
+    # 各数据集的记录只流式读取一次，"all" 由各数据集的结果合并得到
+    names = [name for name, _ in SOURCES]
+    base_datasets = names if "all" in datasets else [ds for ds in names if ds in datasets]
+
+    substring_args: Dict[str, Optional[Tuple[int, Optional[List[str]]]]] = {}
+    for dataset in base_datasets:
+        substring_args[dataset] = None
+        if args.substring:
+            dictionary = None
+            if args.substring_dict:
+                # 全局词典需要预先统计用户名 token，额外读取一遍该数据集
+                dictionary = top_username_tokens(iter_records([dataset]), args.substring_dict, args.substring_min_len)
+            substring_args[dataset] = (args.substring_min_len, dictionary)
+
+    with stage("username_overlap.analysis") as st:
+        if args.workers > 1:
+            accumulators = run_parallel(base_datasets, substring_args, args.max_tracked_tokens, args.workers)
+            st.add(sum(acc.counts["pairs_total"] for acc in accumulators.values()))
+            cache_stats = sum((acc.cache_stats for acc in accumulators.values()), Counter())
+        else:
+            accumulators = {}
+            for dataset in base_datasets:
+                substring = SubstringOverlap(*substring_args[dataset]) if substring_args[dataset] else None
+                accumulators[dataset] = OverlapAccumulator(substring, args.max_tracked_tokens)
+            before = token_cache_stats()
+            for record in iter_records(base_datasets):
+                accumulators[record.dataset].update(record)
+                st.add()
+            cache_stats = token_cache_stats() - before
+        for key, value in cache_stats.items():
+            st.count(key, value)
+
+    results: Dict[str, OverlapAccumulator] = {
+        ds: acc for ds, acc in accumulators.items() if acc.counts["pairs_total"]
+    }
+    if not results:
         raise SystemExit("未找到包含用户名/口令的数据文件。")
+    if "all" in datasets:
+        parts = [results[ds] for ds in base_datasets if ds in results]
+        combined = parts[0]
+        for part in parts[1:]:
+            combined = combined.merge(part)
+        results["all"] = combined
 
-    grouped: Dict[str, List[Record]] = defaultdict(list)
-    for record in records:
-        grouped[record.dataset].append(record)
-
-    datasets = args.dataset or ["all"]
     processed = False
     for dataset in datasets:
-        if dataset == "all":
-            dataset_records = [rec for rec in records]
-        else:
-            dataset_records = grouped.get(dataset, [])
-            if not dataset_records:
-                print(f"[WARN] 数据集 {dataset} 无记录，跳过。")
-                continue
-        counts, token_counter = run_analysis(dataset_records)
-        if not counts["pairs_total"]:
-            print(f"[WARN] 数据集 {dataset} 无有效样本，跳过。")
+        if dataset not in results:
+            print(f"[WARN] 数据集 {dataset} 无记录，跳过。")
             continue
+        acc = results[dataset]
+        counts, token_counter, substring = acc.counts, acc.token_counter, acc.substring
         write_csv(dataset, counts, token_counter)
         write_html(dataset, counts, token_counter)
         write_token_file(dataset, counts, token_counter, args.coverage_threshold, args.max_token_count)
-        print_summary(dataset, counts)
+        print_summary(dataset, counts, token_counter)
+        if substring is not None:
+            substring.write_csv(dataset)
+            substring.print_summary()
         processed = True
 
     if not processed:
         raise SystemExit("没有生成任何分析结果。")
+    print(format_cache_stats(cache_stats))
 
 
 if __name__ == "__main__":
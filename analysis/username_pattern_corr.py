@@ -12,16 +12,16 @@ from __future__ import annotations
 
 import csv
 import math
+import sys
 from collections import defaultdict
 from pathlib import Path
 from typing import Dict, List, Sequence, Tuple
 
-import matplotlib.pyplot as plt
-import numpy as np
-
-plt.rcParams["font.sans-serif"] = ["Arial Unicode MS"]
-
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from instrumentation import stage  # noqa: E402
+from password_structure import UNICODE_CLASSES, pattern_key  # noqa: E402
+
 DATA_DIR = ROOT / "data"
 RESULTS_DIR = ROOT / "analysis" / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -72,26 +72,7 @@ def load_pairs() -> List[Tuple[str, str, str]]:
 def to_pattern(text: str) -> str:
     if not text:
         return "EMPTY"
-    def classify(ch: str) -> str:
-        if ch.isalpha():
-            return "L"
-        if ch.isdigit():
-            return "D"
-        return "S"
-
-    pattern_parts: List[str] = []
-    current_type = classify(text[0])
-    count = 1
-    for ch in text[1:]:
-        t = classify(ch)
-        if t == current_type:
-            count += 1
-        else:
-            pattern_parts.append(f"{current_type}{count}")
-            current_type = t
-            count = 1
-    pattern_parts.append(f"{current_type}{count}")
-    return "".join(pattern_parts)
+    return pattern_key(text, UNICODE_CLASSES)
 
 
 def pearson(xs: Sequence[int], ys: Sequence[int]) -> float:
@@ -133,21 +114,24 @@ def spearman(xs: Sequence[int], ys: Sequence[int]) -> float:
 
 
 def main() -> None:
-    pairs = load_pairs()
+    with stage("username_pattern_corr.load") as st:
+        pairs = load_pairs()
+        st.add(len(pairs))
     if not pairs:
         raise SystemExit("未找到用户名/口令样本。")
 
     length_data: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
     pattern_matrix: Dict[Tuple[str, str], int] = defaultdict(int)
 
-    for dataset, username, password in pairs:
-        lu = len(username)
-        lp = len(password)
-        length_data[dataset].append((lu, lp))
+    with stage("username_pattern_corr.patterns", items=len(pairs)):
+        for dataset, username, password in pairs:
+            lu = len(username)
+            lp = len(password)
+            length_data[dataset].append((lu, lp))
 
-        up = to_pattern(username)
-        pp = to_pattern(password)
-        pattern_matrix[(up, pp)] += 1
+            up = to_pattern(username)
+            pp = to_pattern(password)
+            pattern_matrix[(up, pp)] += 1
 
     # 相关系数输出
     stats = {}
@@ -155,29 +139,52 @@ def main() -> None:
         if not values:
             stats[dataset] = {"pearson": float("nan"), "spearman": float("nan"), "count": 0}
             continue
-        arr = np.array(values, dtype=int)
-        xs = arr[:, 0]
-        ys = arr[:, 1]
+        xs = [lu for lu, _ in values]
+        ys = [lp for _, lp in values]
         stats[dataset] = {
-            "pearson": pearson(xs.tolist(), ys.tolist()),
-            "spearman": spearman(xs.tolist(), ys.tolist()),
-            "count": arr.shape[0],
+            "pearson": pearson(xs, ys),
+            "spearman": spearman(xs, ys),
+            "count": len(values),
         }
 
+    scatter_path = plot_length_scatter(length_data, stats)
+
+    # 写入模式矩阵
+    matrix_path = RESULTS_DIR / "username_pattern_matrix.csv"
+    with matrix_path.open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["username_pattern", "password_pattern", "count"])
+        for (up, pp), cnt in sorted(pattern_matrix.items(), key=lambda item: item[1], reverse=True):
+            writer.writerow([up, pp, cnt])
+
+    print("=== 长度相关性 ===")
+    for dataset, values in stats.items():
+        print(
+            f"{dataset}: n={values['count']} Pearson={values['pearson']:.3f} Spearman={values['spearman']:.3f}"
+        )
+    print(f"散点图输出：{scatter_path}")
+    print(f"模式矩阵输出：{matrix_path}")
+
+
+def plot_length_scatter(length_data: Dict[str, List[Tuple[int, int]]], stats: Dict[str, Dict[str, float]]) -> Path:
+    # matplotlib 只在绘图时导入，计算与 --help 无需加载
+    import matplotlib.pyplot as plt
+
+    plt.rcParams["font.sans-serif"] = ["Arial Unicode MS"]
+
     # 绘制散点图
     fig, ax = plt.subplots(figsize=(8, 6))
     colors = {"csdn": "#1f77b4", "yahoo": "#ff7f0e"}
     for dataset, values in length_data.items():
-        arr = np.array(values, dtype=int)
-        if arr.size == 0:
+        if not values:
             continue
-        xs = arr[:, 0]
-        ys = arr[:, 1]
-        n = arr.shape[0]
+        xs = [lu for lu, _ in values]
+        ys = [lp for _, lp in values]
+        n = len(values)
         ax.scatter(xs, ys, s=12, alpha=0.4, label=f"{dataset} (n={n})", color=colors.get(dataset, None))
         ax.text(
-            xs.max(),
-            ys.max(),
+            max(xs),
+            max(ys),
             f"{dataset} Pearson={stats[dataset]['pearson']:.2f}, Spearman={stats[dataset]['spearman']:.2f}",
             fontsize=8,
             color=colors.get(dataset, "black"),
@@ -192,22 +199,7 @@ def main() -> None:
     scatter_path = RESULTS_DIR / "username_pwd_length_corr.png"
     fig.savefig(scatter_path, dpi=200)
     plt.close(fig)
-
-    # 写入模式矩阵
-    matrix_path = RESULTS_DIR / "username_pattern_matrix.csv"
-    with matrix_path.open("w", encoding="utf-8", newline="") as fh:
-        writer = csv.writer(fh)
-        writer.writerow(["username_pattern", "password_pattern", "count"])
-        for (up, pp), cnt in sorted(pattern_matrix.items(), key=lambda item: item[1], reverse=True):
-            writer.writerow([up, pp, cnt])
-
-    print("=== 长度相关性 ===")
-    for dataset, values in stats.items():
-        print(
-            f"{dataset}: n={values['count']} Pearson={values['pearson']:.3f} Spearman={values['spearman']:.3f}"
-        )
-    print(f"散点图输出：{scatter_path}")
-    print(f"模式矩阵输出：{matrix_path}")
+    return scatter_path
 
 
 if __name__ == "__main__":
@@ -6,16 +6,15 @@
 from __future__ import annotations
 
 import json
+import sys
 from collections import Counter, defaultdict
 from pathlib import Path
 from typing import Dict, List, Set, Tuple
 
-import matplotlib.pyplot as plt
-import numpy as np
-
-plt.rcParams["font.sans-serif"] = ["Arial Unicode MS"]
-
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from instrumentation import stage  # noqa: E402
+
 DATA_DIR = ROOT / "data"
 RESULTS_DIR = ROOT / "analysis" / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -171,7 +170,9 @@ def ensure_category_order(categories: Set[str]) -> List[str]:
 
 
 def main() -> None:
-    pairs = load_pairs()
+    with stage("username_transform_rules.load") as st:
+        pairs = load_pairs()
+        st.add(len(pairs))
     if not pairs:
         raise SystemExit("未找到用户名/口令样本。")
 
@@ -179,20 +180,17 @@ def main() -> None:
     dataset_counter: Dict[str, Counter] = defaultdict(Counter)
     examples: Dict[str, List[Dict[str, str]]] = defaultdict(list)
 
-    for dataset, username, password in pairs:
-        cats = classify(username.strip(), password.strip())
-        for cat in cats:
-            global_counter[cat] += 1
-            dataset_counter[dataset][cat] += 1
-            if len(examples[cat]) < 5:
-                examples[cat].append({"dataset": dataset, "username": username, "password": password})
+    with stage("username_transform_rules.classify", items=len(pairs)):
+        for dataset, username, password in pairs:
+            cats = classify(username.strip(), password.strip())
+            for cat in cats:
+                global_counter[cat] += 1
+                dataset_counter[dataset][cat] += 1
+                if len(examples[cat]) < 5:
+                    examples[cat].append({"dataset": dataset, "username": username, "password": password})
 
     matrix_categories = ensure_category_order(set(global_counter.keys()))
     datasets = [ds for ds, _ in SOURCES]
-    heatmap_data = np.zeros((len(matrix_categories), len(datasets)), dtype=float)
-    for row, cat in enumerate(matrix_categories):
-        for col, dataset in enumerate(datasets):
-            heatmap_data[row, col] = dataset_counter[dataset].get(cat, 0)
 
     # 生成 JSON 报告
     json_payload = {
@@ -211,6 +209,24 @@ def main() -> None:
         }
         json.dump(serializable, fh, ensure_ascii=False, indent=2)
 
+    heatmap_path = plot_heatmap(matrix_categories, datasets, dataset_counter)
+
+    print(f"写入统计：{json_path}")
+    print(f"写入热力图：{heatmap_path}")
+
+
+def plot_heatmap(matrix_categories: List[str], datasets: List[str], dataset_counter: Dict[str, Counter]) -> Path:
+    # numpy / matplotlib 只在绘图时导入，其它脚本 import 本模块时无需加载
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    plt.rcParams["font.sans-serif"] = ["Arial Unicode MS"]
+
+    heatmap_data = np.zeros((len(matrix_categories), len(datasets)), dtype=float)
+    for row, cat in enumerate(matrix_categories):
+        for col, dataset in enumerate(datasets):
+            heatmap_data[row, col] = dataset_counter[dataset].get(cat, 0)
+
     # 绘制热力图
     fig, ax = plt.subplots(figsize=(8, max(4, len(matrix_categories) * 0.4)))
     im = ax.imshow(heatmap_data, cmap="YlOrRd", aspect="auto")
@@ -232,9 +248,7 @@ def main() -> None:
     heatmap_path = RESULTS_DIR / "username_transform_heatmap.png"
     fig.savefig(heatmap_path, dpi=200)
     plt.close(fig)
-
-    print(f"写入统计：{json_path}")
-    print(f"写入热力图：{heatmap_path}")
+    return heatmap_path
 
 
 if __name__ == "__main__":
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+端到端基准测试：在临时工作区中用合成泄露数据依次运行各阶段，记录耗时、吞吐与峰值内存。
+
+每个阶段在独立子进程中运行（通过 os.wait4 取得子进程自身的峰值 RSS），
+结果以 JSON 写入 benchmarks/results/，便于不同提交之间对比。
+
+示例：
+    python benchmarks/run_benchmarks.py --lines 100000 --lines 1000000
+    python benchmarks/run_benchmarks.py --stage split_data --stage generate_rules -d csdn
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from synth_leaks import write_leak
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+DATASETS = ["csdn", "yahoo"]
+
+
+def count_lines(path: Path) -> int:
+    if not path.exists():
+        return 0
+    with path.open("rb") as fh:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: fh.read(1 << 20), b""))
+
+
+def split_sizes(path: Path) -> tuple[int, int]:
+    if not path.exists():
+        return 0, 0
+    with path.open("rb") as fh:
+        train, test = pickle.load(fh)
+    return len(train), len(test)
+
+
+@dataclass
+class Stage:
+    name: str
+    cwd: str
+    code: str
+    per_dataset: bool = True
+    # 根据工作区与数据集计算本阶段处理的条目数
+    items: Optional[Callable[[Path, str], int]] = None
+
+
+def leak_lines(workspace: Path, dataset: str) -> int:
+    if dataset == "all":
+        return sum(count_lines(workspace / "data" / f"{ds}.txt") for ds in DATASETS)
+    return count_lines(workspace / "data" / f"{dataset}.txt")
+
+
+STAGES: List[Stage] = [
+    Stage("split_data", "pcfg_advance", "import split_data; split_data.main()"),
+    Stage(
+        "generate_rules",
+        "pcfg_advance",
+        "import generate_rules; generate_rules.main()",
+        items=lambda ws, ds: split_sizes(ws / "data" / f"data_{ds}.pkl")[0],
+    ),
+    Stage(
+        "pcfg_generate",
+        "pcfg_advance",
+        "from utils import load_pcfg_module\n"
+        "m = load_pcfg_module()\n"
+        "pwds = m.PCFG().generate()\n"
+        "with open(f'{m.FILE_NAME}_genpwds.txt', 'w') as f:\n"
+        "    for pwd, p in pwds[:m.GUESS_COUNT]:\n"
+        "        f.write(f'{pwd} {p}\\n')\n",
+        items=lambda ws, ds: count_lines(ws / "pcfg_advance" / f"{ds}_genpwds.txt"),
+    ),
+    Stage(
+        "test",
+        "pcfg_advance",
+        "import test; test.test(test.FILE_NAME)",
+        items=lambda ws, ds: split_sizes(ws / "data" / f"data_{ds}.pkl")[1],
+    ),
+    Stage("analysis_task_1", "analysis", "import analysis_task_1; analysis_task_1.main()"),
+    Stage("analysis_task_2", "analysis", "import analysis_task_2 as m; m.components_analysis(m.init_data())"),
+    Stage("analysis_task_3", "analysis", "import analysis_task_3; analysis_task_3.main()"),
+    Stage(
+        "analysis_task_4",
+        "analysis",
+        "import analysis_task_4; analysis_task_4.main()",
+        items=lambda ws, ds: split_sizes(ws / "data" / f"data_{ds}.pkl")[0],
+    ),
+    Stage(
+        "analysis_task_5",
+        "analysis",
+        "import analysis_task_5; analysis_task_5.main()",
+        items=lambda ws, ds: split_sizes(ws / "data" / f"data_{ds}.pkl")[0],
+    ),
+    Stage(
+        "username_overlap",
+        "analysis",
+        "import sys, username_overlap\n"
+        "sys.argv = ['username_overlap.py', '--dataset', 'csdn', '--dataset', 'yahoo', '--dataset', 'all']\n"
+        "username_overlap.main()\n",
+        per_dataset=False,
+    ),
+    Stage("username_transform_rules", "analysis", "import username_transform_rules; username_transform_rules.main()", per_dataset=False),
+    Stage("username_pattern_corr", "analysis", "import username_pattern_corr; username_pattern_corr.main()", per_dataset=False),
+]
+
+
+def prepare_workspace(workspace: Path) -> None:
+    """复制脚本与规则/词库到工作区，使各脚本的相对路径照常工作"""
+    # 根目录下的公共模块（instrumentation 等）
+    for script in ROOT.glob("*.py"):
+        shutil.copy2(script, workspace / script.name)
+    for sub in ("analysis", "pcfg_advance"):
+        (workspace / sub).mkdir(parents=True, exist_ok=True)
+        for script in (ROOT / sub).glob("*.py"):
+            shutil.copy2(script, workspace / sub / script.name)
+    shutil.copytree(ROOT / "analysis" / "lib", workspace / "analysis" / "lib", dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns("*.xls"))
+    shutil.copytree(ROOT / "pcfg_advance" / "lib", workspace / "pcfg_advance" / "lib", dirs_exist_ok=True)
+    for dataset in DATASETS:
+        shutil.copytree(ROOT / "pcfg_advance" / dataset, workspace / "pcfg_advance" / dataset, dirs_exist_ok=True)
+    for sub in ("data", "analysis/results", "analysis/mid", "logs"):
+        (workspace / sub).mkdir(parents=True, exist_ok=True)
+    # generate_rules 以 ./data/ 读取切分结果，与 split_data/test 共用根目录下的 data/
+    link = workspace / "pcfg_advance" / "data"
+    if not link.exists():
+        link.symlink_to(workspace / "data", target_is_directory=True)
+
+
+def run_stage(stage: Stage, workspace: Path, dataset: str, timeout: Optional[float] = None) -> Dict[str, object]:
+    env = dict(os.environ, PCFG_DATASET=dataset, ANALYSIS_DATASET=dataset, MPLBACKEND="Agg")
+    log_path = workspace / "logs" / f"{stage.name}_{dataset}.log"
+    with log_path.open("w", encoding="utf-8") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-c", stage.code],
+            cwd=workspace / stage.cwd,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        timer = threading.Timer(timeout, proc.kill) if timeout else None
+        if timer:
+            timer.start()
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+        timed_out = bool(timer) and not timer.is_alive()
+        if timer:
+            timer.cancel()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # Linux 下 ru_maxrss 单位为 KB，macOS 为字节
+    peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    items = stage.items(workspace, dataset) if stage.items else leak_lines(workspace, dataset)
+    result: Dict[str, object] = {
+        "stage": stage.name,
+        "dataset": dataset,
+        "returncode": proc.returncode,
+        "seconds": round(seconds, 3),
+        "items": items,
+        "items_per_sec": round(items / seconds, 1) if seconds else 0.0,
+        "peak_rss_mb": round(peak_mb, 1),
+        "timed_out": timed_out,
+    }
+    if proc.returncode != 0:
+        with log_path.open(encoding="utf-8", errors="ignore") as fh:
+            result["error"] = fh.read()[-2000:]
+    return result
+
+
+def run_size(
+    lines: int,
+    datasets: List[str],
+    stages: List[Stage],
+    workdir: Optional[Path],
+    keep: bool,
+    seed: int,
+    timeout: Optional[float],
+) -> Dict[str, object]:
+    workspace = Path(tempfile.mkdtemp(prefix=f"bench_{lines}_", dir=workdir))
+    try:
+        prepare_workspace(workspace)
+        synth_start = time.perf_counter()
+        # 用户名相关脚本同时读取两个数据集，因此总是生成两份数据
+        for dataset in DATASETS:
+            write_leak(dataset, workspace / "data" / f"{dataset}.txt", lines, seed)
+        synth_seconds = time.perf_counter() - synth_start
+
+        results = []
+        for stage in stages:
+            targets = datasets if stage.per_dataset else ["all"]
+            for dataset in targets:
+                result = run_stage(stage, workspace, dataset, timeout)
+                results.append(result)
+                if result["timed_out"]:
+                    status = "TIMEOUT"
+                else:
+                    status = "ok" if result["returncode"] == 0 else f"FAILED({result['returncode']})"
+                print(
+                    f"[{lines}] {stage.name:<26} {dataset:<6} {result['seconds']:>10.2f}s "
+                    f"{result['items_per_sec']:>12.1f} items/s {result['peak_rss_mb']:>8.1f} MB  {status}"
+                )
+        return {"lines": lines, "synth_seconds": round(synth_seconds, 3), "stages": results}
+    finally:
+        if keep:
+            print(f"工作区保留在：{workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="口令分析与 PCFG 流水线基准测试")
+    parser.add_argument("--lines", "-n", type=int, action="append", help="每个数据集的合成行数，可多次传入（默认 1e5）")
+    parser.add_argument("--dataset", "-d", action="append", choices=DATASETS, help="按数据集运行的阶段使用哪些数据集（默认两者）")
+    parser.add_argument("--stage", "-s", action="append", choices=[stage.name for stage in STAGES], help="只运行指定阶段（默认全部，按流水线顺序）")
+    parser.add_argument("--workdir", type=Path, default=None, help="临时工作区所在目录")
+    parser.add_argument("--keep", action="store_true", help="保留工作区以便查看日志与中间结果")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=None, help="单个阶段的超时秒数，超时后终止并记录")
+    parser.add_argument("--output", type=Path, default=None, help="JSON 报告路径（默认 benchmarks/results/bench_<时间>.json）")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    selected = set(args.stage or [])
+    stages = [stage for stage in STAGES if not selected or stage.name in selected]
+    datasets = args.dataset or DATASETS
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "runs": [run_size(lines, datasets, stages, args.workdir, args.keep, args.seed, args.timeout) for lines in args.lines or [100000]],
+    }
+    output = args.output or RESULTS_DIR / f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w", encoding="utf-8") as fh:
+        json.dump(report, fh, ensure_ascii=False, indent=2)
+    print(f"基准报告：{output}")
+
+
+if __name__ == "__main__":
+    main()
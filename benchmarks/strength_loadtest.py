@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+口令强度服务（pcfg_advance/strength_server.py）的压测脚本。
+
+用 --concurrency 个长连接并发发送 /score 请求，口令与用户名由 synth_leaks.LeakSampler 按规则表合成。
+结束后输出客户端侧的 p50/p99 延迟与吞吐，以及服务端 /metrics 的统计（含平均批大小）。
+
+示例：
+    python pcfg_advance/strength_server.py &
+    python benchmarks/strength_loadtest.py --requests 20000 --concurrency 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from synth_leaks import LeakSampler
+
+
+async def _request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str, payload: Optional[dict] = None
+) -> dict:
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+    length = 0
+    status = await reader.readline()
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    data = await reader.readexactly(length)
+    if not status.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(f"{status.decode().strip()}: {data.decode()}")
+    return json.loads(data)
+
+
+async def _connect(host: str, port: int, unix_path: Optional[str]) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _client(host: str, port: int, unix_path: Optional[str], items: List[Dict[str, str]], latencies: List[float]) -> None:
+    reader, writer = await _connect(host, port, unix_path)
+    try:
+        for item in items:
+            started = time.perf_counter()
+            await _request(reader, writer, "POST", "/score", item)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    sampler = LeakSampler(args.dataset, args.seed)
+    items = []
+    for username, password, _ in sampler.records(args.requests):
+        item = {"password": password}
+        if args.with_username:
+            item["username"] = username
+        items.append(item)
+
+    latencies: List[float] = []
+    shards = [items[i :: args.concurrency] for i in range(args.concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(args.host, args.port, args.unix, shard, latencies) for shard in shards if shard))
+    elapsed = time.perf_counter() - started
+
+    print(f"requests: {len(latencies)}  concurrency: {args.concurrency}  elapsed: {elapsed:.2f}s")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s")
+    print(f"client latency p50: {percentile(latencies, 50) * 1000:.2f} ms  p99: {percentile(latencies, 99) * 1000:.2f} ms")
+
+    reader, writer = await _connect(args.host, args.port, args.unix)
+    metrics = await _request(reader, writer, "GET", "/metrics")
+    writer.close()
+    print("server metrics:", json.dumps(metrics, indent=2))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test for the password strength server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8421)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--dataset", default="csdn", help="which rule tables to sample passwords from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-username", dest="with_username", action="store_false", help="omit usernames (skip reuse classification)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
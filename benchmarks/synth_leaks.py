@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+合成 CSDN / Yahoo 风格的泄露数据，用于基准测试（原始泄露数据未上传 GitHub）。
+
+口令按仓库中已提交的 PCFG 规则表采样（pattern_rule × number_rule / char_rule），
+因此长度与结构分布与真实数据接近；另混入一定比例的大写、符号、过短/过长口令，
+使 split_data 的过滤阶段有实际工作量。约 20% 的口令由用户名派生，保证用户名分析脚本有信号。
+
+输出格式：
+- CSDN：`username # password # email`
+- Yahoo：`id:email:password`
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import string
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+PCFG_DIR = ROOT / "pcfg_advance"
+
+DOMAINS = {
+    "csdn": (["qq.com", "163.com", "126.com", "sina.com", "gmail.com", "yahoo.com.cn", "hotmail.com"], [40, 20, 12, 8, 8, 6, 6]),
+    "yahoo": (["yahoo.com", "gmail.com", "hotmail.com", "aol.com", "msn.com"], [70, 10, 10, 6, 4]),
+}
+SYMBOLS = "!@#$%^&*._-"
+BATCH = 10000
+
+Table = Tuple[List[str], List[float]]
+
+
+def read_table(path: Path) -> List[Tuple[str, float]]:
+    items = []
+    with path.open(encoding="utf-8") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) == 2:
+                items.append((parts[0], float(parts[1])))
+    return items
+
+
+def cumulative(items: Sequence[Tuple[str, float]]) -> Table:
+    values = [value for value, _ in items]
+    weights = list(itertools.accumulate(p for _, p in items))
+    return values, weights
+
+
+class LeakSampler:
+    """按数据集的规则表采样口令、用户名与邮箱"""
+
+    def __init__(self, dataset: str, seed: int = 0) -> None:
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        rule_dir = PCFG_DIR / dataset
+        patterns = []
+        for key, p in read_table(rule_dir / "pattern_rule.txt"):
+            parts = key.split(",")
+            patterns.append((tuple((parts[i], int(parts[i + 1])) for i in range(0, len(parts), 2)), p))
+        self.patterns = [pattern for pattern, _ in patterns]
+        self.pattern_weights = list(itertools.accumulate(p for _, p in patterns))
+        self.terminals: Dict[Tuple[str, int], Table] = {}
+        for key, filename in (("D", "number_rule.txt"), ("L", "char_rule.txt")):
+            by_length: Dict[int, List[Tuple[str, float]]] = {}
+            for value, p in read_table(rule_dir / filename):
+                by_length.setdefault(len(value), []).append((value, p))
+            for length, items in by_length.items():
+                self.terminals[(key, length)] = cumulative(items)
+        tokens = read_table(PCFG_DIR / "lib" / "username_tokens.txt")
+        self.name_tokens = cumulative([(t, p) for t, p in tokens if t.isalpha() and len(t) > 1])
+        self.domains = DOMAINS.get(dataset, DOMAINS["csdn"])
+
+    def _terminal(self, key: str, length: int) -> str:
+        table = self.terminals.get((key, length))
+        if table is None:
+            alphabet = string.digits if key == "D" else string.ascii_lowercase
+            return "".join(self.rng.choice(alphabet) for _ in range(length))
+        values, weights = table
+        return self.rng.choices(values, cum_weights=weights)[0]
+
+    def password(self, pattern: Tuple[Tuple[str, int], ...]) -> str:
+        pwd = "".join(self._terminal(key, length) for key, length in pattern)
+        roll = self.rng.random()
+        if roll < 0.08:
+            return pwd.capitalize()
+        if roll < 0.14:
+            return pwd + self.rng.choice(SYMBOLS)
+        if roll < 0.18:
+            return pwd[: self.rng.randint(1, 5)]
+        if roll < 0.20:
+            return pwd + self._terminal("D", 6)
+        return pwd
+
+    def username(self) -> str:
+        values, weights = self.name_tokens
+        name = self.rng.choices(values, cum_weights=weights)[0]
+        roll = self.rng.random()
+        if roll < 0.5:
+            name += str(self.rng.randint(0, 9999))
+        elif roll < 0.7:
+            name += self.rng.choices(values, cum_weights=weights)[0]
+        return name
+
+    def records(self, count: int):
+        for start in range(0, count, BATCH):
+            size = min(BATCH, count - start)
+            patterns = self.rng.choices(self.patterns, cum_weights=self.pattern_weights, k=size)
+            domains = self.rng.choices(self.domains[0], weights=self.domains[1], k=size)
+            for pattern, domain in zip(patterns, domains):
+                username = self.username()
+                roll = self.rng.random()
+                if roll < 0.10:
+                    password = username.lower()
+                elif roll < 0.20:
+                    password = username.lower() + self._terminal("D", self.rng.choice((2, 3, 4)))
+                else:
+                    password = self.password(pattern)
+                yield username, password, f"{username.lower()}@{domain}"
+
+
+def write_leak(dataset: str, path: Path, count: int, seed: int = 0) -> Path:
+    sampler = LeakSampler(dataset, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as fh:
+        for idx, (username, password, email) in enumerate(sampler.records(count), start=1):
+            if dataset == "yahoo":
+                fh.write(f"{idx}:{email}:{password}\n")
+            else:
+                fh.write(f"{username} # {password} # {email}\n")
+    return path
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="生成合成的 CSDN/Yahoo 泄露数据")
+    parser.add_argument("--dataset", "-d", action="append", choices=["csdn", "yahoo"], help="可多次传入（默认两者）")
+    parser.add_argument("--lines", "-n", type=int, default=100000, help="每个数据集的行数（默认 1e5）")
+    parser.add_argument("--output-dir", type=Path, default=ROOT / "data", help="输出目录（默认 data/）")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    for dataset in args.dataset or ["csdn", "yahoo"]:
+        path = write_leak(dataset, args.output_dir / f"{dataset}.txt", args.lines, args.seed)
+        print(f"写入 {args.lines} 行：{path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+各阶段共用的轻量级计时/计数工具，并输出结构化运行报告。
+
+用法：
+    from instrumentation import stage, timed
+
+    with stage("generate_rules.char", items=len(passwords)):
+        ...
+
+    @timed("analysis_task_3.infer_spaces")
+    def infer_spaces(s): ...
+
+每个阶段结束时向 run_report.jsonl 追加一行 JSON（stage, items, seconds, items_per_sec, peak_mb）。
+报告默认放在入口脚本所在目录（pcfg_advance/ 下即与 res.txt、info.txt 相邻），可用环境变量 RUN_REPORT 指定路径。
+
+环境变量 STAGE_PROFILE 打开可选的剖析（逗号分隔，可组合）：
+- cprofile：每个阶段保存 <stage>.prof（可用 pstats / snakeviz 查看）
+- tracemalloc：按阶段统计 Python 对象分配峰值，替代进程级 RSS 峰值
+- timed：@timed 累计热点函数的耗时与调用次数，进程退出时写入；未打开时 @timed 直接返回原函数
+"""
+
+from __future__ import annotations
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_FLAGS = {flag.strip() for flag in os.getenv("STAGE_PROFILE", "").lower().split(",") if flag.strip()}
+
+
+def _default_report_path() -> Path:
+    env_path = os.getenv("RUN_REPORT")
+    if env_path:
+        return Path(env_path)
+    script = Path(sys.argv[0]) if sys.argv and sys.argv[0] else None
+    if script is not None and script.is_file():
+        return script.resolve().parent / "run_report.jsonl"
+    return Path.cwd() / "run_report.jsonl"
+
+
+REPORT_PATH = _default_report_path()
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 下单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def write_record(record: Dict[str, object]) -> None:
+    record = {"time": datetime.now().isoformat(timespec="seconds"), "script": Path(sys.argv[0]).name, **record}
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with REPORT_PATH.open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class Stage:
+    """一个阶段的运行统计；items 可在运行中通过 add() 累加"""
+
+    def __init__(self, name: str, items: int = 0) -> None:
+        self.name = name
+        self.items = items
+        self.counters: Dict[str, int] = {}
+        self.seconds = 0.0
+
+    def add(self, n: int = 1) -> None:
+        self.items += n
+
+    def count(self, key: str, n: int = 1) -> None:
+        self.counters[key] = self.counters.get(key, 0) + n
+
+
+def _profile_path(name: str) -> Path:
+    return REPORT_PATH.parent / f"{name.replace('/', '_')}.prof"
+
+
+@contextmanager
+def stage(name: str, items: int = 0) -> Iterator[Stage]:
+    """对一段代码计时，结束时追加一条运行报告"""
+    current = Stage(name, items)
+    profiler = cProfile.Profile() if "cprofile" in PROFILE_FLAGS else None
+    use_tracemalloc = "tracemalloc" in PROFILE_FLAGS
+    if use_tracemalloc:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    if profiler:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(str(_profile_path(name)))
+        if use_tracemalloc:
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        else:
+            peak_mb = _peak_rss_mb()
+        record: Dict[str, object] = {
+            "stage": name,
+            "items": current.items,
+            "seconds": round(current.seconds, 4),
+            "items_per_sec": round(current.items / current.seconds, 1) if current.seconds else 0.0,
+            "peak_mb": round(peak_mb, 1),
+        }
+        if current.counters:
+            record["counters"] = current.counters
+        write_record(record)
+
+
+class _Accumulator:
+    __slots__ = ("calls", "seconds")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+
+
+_ACCUMULATORS: Dict[str, _Accumulator] = {}
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """累计热点函数的调用次数与耗时，进程退出时作为一条报告写出；
+    只在 STAGE_PROFILE 含 timed 时生效，否则不包装，热点函数没有额外开销"""
+
+    def decorator(func: Callable) -> Callable:
+        if "timed" not in PROFILE_FLAGS:
+            return func
+        key = name or f"{func.__module__}.{func.__qualname__}"
+        acc = _ACCUMULATORS.setdefault(key, _Accumulator())
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                acc.seconds += time.perf_counter() - start
+                acc.calls += 1
+
+        return wrapper
+
+    return decorator
+
+
+@atexit.register
+def _flush_accumulators() -> None:
+    for key, acc in _ACCUMULATORS.items():
+        if not acc.calls:
+            continue
+        write_record(
+            {
+                "stage": key,
+                "items": acc.calls,
+                "seconds": round(acc.seconds, 4),
+                "items_per_sec": round(acc.calls / acc.seconds, 1) if acc.seconds else 0.0,
+                "peak_mb": round(_peak_rss_mb(), 1),
+            }
+        )
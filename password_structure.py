@@ -0,0 +1,152 @@
+"""
+口令结构切分：把字符串按字符类别切成连续的游程（run），如 "123ab32a" -> D3 L2 D2 L1。
+
+每个字符先映射为一个类别码（ASCII 口令走 bytes.translate 的 256 字节查表，其余走 str.translate），
+再用正则 (.)\\1* 在类别码串上一次取出所有游程。类别码串相同的口令结构也相同，而一份泄露数据中
+不同的结构只有几千种，因此 (类别码串, 格式) -> (模式串, 游程) 的结果按类别表缓存，
+绝大多数口令只需一次查表和一次 dict 命中。generate_rules、analysis_task_4、username_pattern_corr
+共用这里的实现，各自只在类别表与模式串格式上不同：
+
+    from password_structure import structure, ASCII_CLASSES
+
+    key, runs = structure("123ab32a", ASCII_CLASSES)
+    # key == "D3L2D2L1", runs == (("D", 0, 3), ("L", 3, 5), ("D", 5, 7), ("L", 7, 8))
+
+模式串经过 sys.intern，同一结构的大量口令共享一个字符串对象。整批处理时 batch_codes() 把口令
+以换行拼接后一次 translate 得到全部类别码串，再用 structure_of() 只对不同的类别码串求结构。
+
+泄露数据中重复口令极多（"123456" 等可出现数十万次），unique_counts() 先把训练集压缩为
+(去重口令, 次数)，规则与分析函数按次数加权，逐口令的开销只在每个不同口令上付一次。
+"""
+
+from __future__ import annotations
+
+import re
+import string
+import sys
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+Run = Tuple[str, int, int]
+Structure = Tuple[str, Tuple[Run, ...]]
+
+RUN_PATTERN = re.compile(rb"(.)\1*", re.S)
+# 每个类别表缓存的结构数上限
+CACHE_SIZE = 1 << 16
+
+
+class ClassTable(dict):
+    """str.translate 用的类别表；表中没有的字符交给 classify 判定并记住结果"""
+
+    def __init__(self, mapping: Dict[int, str], classify: Optional[Callable[[str], str]] = None, default: str = "S") -> None:
+        super().__init__(mapping)
+        self.classify = classify
+        self.default = default
+        self.ascii_table = bytes(ord(self[code]) for code in range(128)) + bytes(128)
+        # 整批翻译时换行作为口令分隔符原样保留（见 batch_codes）
+        self.batch_table = self.ascii_table[:10] + b"\n" + self.ascii_table[11:]
+        self.cache: Dict[Tuple[bytes, str, str], Structure] = {}
+
+    def __missing__(self, code: int) -> str:
+        value = self.classify(chr(code)) if self.classify else self.default
+        self[code] = value
+        return value
+
+    def codes(self, text: str) -> bytes:
+        if text.isascii():
+            return text.encode("ascii").translate(self.ascii_table)
+        return text.translate(self).encode("ascii")
+
+
+def _table(groups, classify: Optional[Callable[[str], str]] = None, default: str = "S") -> ClassTable:
+    mapping = {}
+    for chars, value in groups:
+        for ch in chars:
+            mapping[ord(ch)] = value
+    return ClassTable(mapping, classify, default)
+
+
+def _unicode_class(ch: str) -> str:
+    if ch.isalpha():
+        return "L"
+    if ch.isdigit():
+        return "D"
+    return "S"
+
+
+# ASCII 数字 / ASCII 大小写字母 / 其它（analysis_task_4）
+ASCII_CLASSES = _table([(string.digits, "D"), (string.ascii_letters, "L")])
+# Unicode 字母 / 数字 / 其它（username_pattern_corr）
+UNICODE_CLASSES = _table([(string.digits, "D"), (string.ascii_letters, "L")], classify=_unicode_class)
+# PCFG 规则只区分数字与小写字母，其它字符仅起分隔作用（generate_rules）
+PCFG_CLASSES = _table([(string.digits, "D"), (string.ascii_lowercase, "L")])
+
+
+def _build(codes: bytes, fmt: str, skip: str) -> Structure:
+    spans = tuple(
+        (chr(m.group(1)[0]), m.start(), m.end())
+        for m in RUN_PATTERN.finditer(codes)
+        if chr(m.group(1)[0]) not in skip
+    )
+    key = "".join([fmt.format(cls, end - start) for cls, start, end in spans])
+    return sys.intern(key), spans
+
+
+def batch_codes(texts: Sequence[str], classes: ClassTable = ASCII_CLASSES) -> List[bytes]:
+    """整批口令的类别码：以换行拼接后只做一次 encode + translate 再按换行切开，
+    与逐条调用 classes.codes() 的结果一一对应；含非 ASCII 字符的口令单独重算"""
+    buffer = "\n".join(texts)
+    if buffer.count("\n") != len(texts) - 1:
+        return [classes.codes(text) for text in texts]
+    joined = buffer.encode("utf-8", "surrogatepass").translate(classes.batch_table)
+    codes = joined.split(b"\n")
+    # 非 ASCII 字节在表中映射为 \x00，只有出现 \x00 的批次才需要逐条检查
+    if b"\x00" in joined:
+        for i, code in enumerate(codes):
+            if b"\x00" in code:
+                codes[i] = classes.codes(texts[i])
+    return codes
+
+
+def structure_of(codes: bytes, classes: ClassTable = ASCII_CLASSES, fmt: str = "{}{}", skip: str = "") -> Structure:
+    """由类别码串（classes.codes() 或 batch_codes() 的结果）得到 (模式串, 游程)"""
+    cache_key = (codes, fmt, skip)
+    result = classes.cache.get(cache_key)
+    if result is None:
+        if len(classes.cache) >= CACHE_SIZE:
+            classes.cache.clear()
+        result = classes.cache[cache_key] = _build(codes, fmt, skip)
+    return result
+
+
+def structure(
+    text: str,
+    classes: ClassTable = ASCII_CLASSES,
+    fmt: str = "{}{}",
+    skip: str = "",
+) -> Structure:
+    """一次返回 (模式串, 游程)；模式串按 fmt 逐段格式化 (类别, 长度) 后拼接，
+    skip 中的类别不进入结果，但仍会切断相邻游程"""
+    return structure_of(classes.codes(text), classes, fmt, skip)
+
+
+def structures(
+    texts: Iterable[str],
+    classes: ClassTable = ASCII_CLASSES,
+    fmt: str = "{}{}",
+    skip: str = "",
+) -> Iterator[Structure]:
+    for text in texts:
+        yield structure(text, classes, fmt, skip)
+
+
+def pattern_key(text: str, classes: ClassTable = ASCII_CLASSES, fmt: str = "{}{}", skip: str = "") -> str:
+    """只需要模式串时的便捷函数"""
+    return structure(text, classes, fmt, skip)[0]
+
+
+def unique_counts(passwords: Iterable[str]) -> Tuple[List[str], List[int]]:
+    """把口令列表压缩为 (去重口令, 出现次数)，按首次出现的顺序排列；
+    计数字典的插入顺序因此与逐条处理时相同，排序后并列项的先后也不变"""
+    counter = Counter(passwords)
+    return list(counter), list(counter.values())
@@ -0,0 +1,225 @@
+import argparse
+import itertools
+import math
+import os
+import struct
+import sys
+import numpy as np
+from rank_index import CHUNK_LINES, _read_guesses, fingerprint, fingerprints
+from test import DATA_DIR
+from utils import load_data, load_pcfg_module
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+
+# 文件头：魔数、位数 m、哈希个数 k、条目数 n、目标误判率
+# 魔数末位为格式版本：2 起 \x00 字节也参与指纹计算，旧版文件需重新生成
+MAGIC = b'PCFGBLM2'
+HEADER = struct.Struct('<8sQIQd')
+DEFAULT_FPR = 0.001
+MASK = (1 << 64) - 1
+
+
+def _mix(h):
+    # splitmix64 终结函数：由口令指纹派生第二个哈希，用于双重哈希
+    h = np.asarray(h, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        h = h ^ (h >> np.uint64(31))
+    return h | np.uint64(1)
+
+
+def _mix_int(h):
+    # 与 _mix 相同，单个口令查询时避免 numpy 标量运算的开销
+    h = ((h ^ (h >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+    h = ((h ^ (h >> 27)) * 0x94d049bb133111eb) & MASK
+    return (h ^ (h >> 31)) | 1
+
+
+def optimal_params(n, fpr):
+    """n 个条目、目标误判率 fpr 时的最优位数 m 与哈希个数 k"""
+    n = max(n, 1)
+    m = int(math.ceil(-n * math.log(fpr) / math.log(2) ** 2))
+    m = (m + 7) // 8 * 8
+    k = max(1, int(round(m / n * math.log(2))))
+    return m, k
+
+
+class BloomFilter:
+    """位数组 + k 个哈希（双重哈希 h1 + i·h2 mod m，h1 即 rank_index 的 64 位指纹）
+
+    只会误报不会漏报；文件为固定文件头 + 位数组，load() 以 mmap 方式打开，查询只读 k 个位。
+    """
+
+    def __init__(self, m, k, bits=None, count=0, fpr=DEFAULT_FPR):
+        self.m = m
+        self.k = k
+        self.bits = np.zeros(m // 8, dtype=np.uint8) if bits is None else bits
+        # 单个口令查询走 memoryview，下标访问直接得到 int
+        self._view = memoryview(self.bits)
+        self.count = count
+        self.fpr = fpr
+
+    @classmethod
+    def for_capacity(cls, n, fpr=DEFAULT_FPR):
+        m, k = optimal_params(n, fpr)
+        return cls(m, k, fpr=fpr)
+
+    def _positions(self, fps):
+        # (n, k) 的位下标
+        h2 = _mix(fps)
+        steps = np.arange(self.k, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            return (fps[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.m)
+
+    def add_many(self, passwords):
+        """插入一批口令；count 只计新条目（批内按指纹去重，且至少有一个位原先未置位），
+        重复的猜测不会让 bits_per_entry() / expected_fpr() 偏离实际"""
+        positions = self._positions(np.unique(fingerprints(passwords)))
+        index = (positions >> np.uint64(3)).astype(np.int64)
+        masks = np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)
+        fresh = ((self.bits[index] & masks) == 0).any(axis=1)
+        np.bitwise_or.at(self.bits, index.ravel(), masks.ravel())
+        self.count += int(fresh.sum())
+
+    def contains_many(self, passwords):
+        positions = self._positions(fingerprints(passwords))
+        values = self.bits[(positions >> np.uint64(3)).astype(np.int64)] >> (positions & np.uint64(7)).astype(np.uint8)
+        return (values & 1).all(axis=1)
+
+    def __contains__(self, password):
+        h1 = fingerprint(password)
+        h2 = _mix_int(h1)
+        bits = self._view
+        for i in range(self.k):
+            pos = ((h1 + i * h2) & MASK) % self.m
+            if not bits[pos >> 3] >> (pos & 7) & 1:
+                return False
+        return True
+
+    def bits_per_entry(self):
+        return self.m / self.count if self.count else float('inf')
+
+    def expected_fpr(self):
+        """按实际条目数估计的理论误判率 (1 - e^{-kn/m})^k"""
+        return (1 - math.exp(-self.k * self.count / self.m)) ** self.k
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.m, self.k, self.count, self.fpr))
+            f.write(self.bits.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, m, k, count, fpr = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            if magic[:-1] == MAGIC[:-1]:
+                raise ValueError(f'{path} 是旧版本的黑名单过滤器（指纹算法已变化），请重新生成')
+            raise ValueError(f'{path} 不是口令黑名单过滤器文件')
+        bits = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size, shape=(m // 8,))
+        return cls(m, k, bits, count, fpr)
+
+
+def iter_guess_chunks(source=None, top=None, chunk_lines=CHUNK_LINES):
+    """按块产出口令：source 为 *_genpwds.txt 时逐块读文件，否则从 PCFG.iter_generate() 惰性生成"""
+    if source:
+        remaining = top
+        for passwords, _ in _read_guesses(source, chunk_lines):
+            if remaining is not None:
+                passwords = passwords[:remaining]
+                remaining -= len(passwords)
+            if passwords:
+                yield passwords
+            if remaining == 0:
+                break
+        return
+    pcfg = load_pcfg_module().PCFG(record=False)
+    guesses = pcfg.iter_generate()
+    if top is not None:
+        guesses = itertools.islice(guesses, top)
+    while True:
+        passwords = [guess[0] for guess in itertools.islice(guesses, chunk_lines)]
+        if not passwords:
+            break
+        yield passwords
+
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+
+
+def export(output, source=None, top=None, fpr=DEFAULT_FPR, test_passwords=None):
+    """把前 top 条猜测写成 Bloom 过滤器文件；给出 test_passwords 时统计其中真正在黑名单里的口令，
+    以便随后测量误判率。返回 (过滤器, 测试集中命中的口令集合)"""
+    if top is None:
+        if not source:
+            raise ValueError('从 PCFG 直接生成时必须指定 --top')
+        capacity = _count_lines(source)
+    else:
+        capacity = top
+    bloom = BloomFilter.for_capacity(capacity, fpr)
+    probe = set(test_passwords or ())
+    members = set()
+    with stage('blocklist.export') as st:
+        for passwords in iter_guess_chunks(source, top):
+            bloom.add_many(passwords)
+            if probe:
+                members.update(probe.intersection(passwords))
+            st.add(len(passwords))
+    bloom.save(output)
+    return bloom, members
+
+
+def measure(bloom, test_passwords, members):
+    """测试集上的命中数与实测误判率（不在黑名单中却被判为命中的比例）"""
+    uniques = list(set(test_passwords))
+    hits = bloom.contains_many(uniques)
+    negatives = [hit for password, hit in zip(uniques, hits.tolist()) if password not in members]
+    false_positives = sum(negatives)
+    blocked = sum(1 for password in test_passwords if password in members)
+    return {
+        'test_passwords': len(test_passwords),
+        'blocked': blocked,
+        'negatives': len(negatives),
+        'false_positives': false_positives,
+        'measured_fpr': false_positives / len(negatives) if negatives else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='export the top PCFG guesses as a Bloom filter blocklist')
+    sub = parser.add_subparsers(dest='command', required=True)
+    exp = sub.add_parser('export', help='由 *_genpwds.txt 或 PCFG 生成结果导出过滤器')
+    exp.add_argument('--source', help='*_genpwds.txt；省略时直接调用 PCFG.iter_generate()')
+    exp.add_argument('--top', type=int, default=None, help='只收录前 N 条猜测')
+    exp.add_argument('--fpr', type=float, default=DEFAULT_FPR, help='目标误判率')
+    exp.add_argument('-o', '--output', required=True)
+    check = sub.add_parser('check', help='查询口令是否在黑名单中')
+    check.add_argument('filter')
+    check.add_argument('passwords', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        bloom = BloomFilter.load(args.filter)
+        for password in args.passwords:
+            print(password, 'blocked' if password in bloom else 'ok')
+        return
+
+    file_name = load_pcfg_module().FILE_NAME
+    data_path = os.path.join(DATA_DIR, f'data_{file_name}.pkl')
+    test_data = load_data(data_path)[1] if os.path.exists(data_path) else None
+    bloom, members = export(args.output, args.source, args.top, args.fpr, test_data)
+    size = os.path.getsize(args.output)
+    print(f'{bloom.count} entries, m={bloom.m} bits, k={bloom.k}, {bloom.bits_per_entry():.2f} bits/entry, '
+          f'{size / 1024 / 1024:.1f} MiB, expected fpr {bloom.expected_fpr():.2e}')
+    if test_data is not None:
+        stats = measure(BloomFilter.load(args.output), test_data, members)
+        print('test split: blocked {blocked}/{test_passwords}, false positives {false_positives}/{negatives}, '
+              'measured fpr {measured_fpr:.2e}'.format(**stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,101 +1,211 @@
+import argparse
+from collections import Counter
 import pickle
-from progress.bar import Bar
 import os
 import re
+import sys
 import numpy as np
 from utils import load_data
-import string
+from split_data import _filter_data
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+from password_structure import PCFG_CLASSES, batch_codes, structure_of, unique_counts
 
 FILE_NAME = 'yahoo'
 # FILE_NAME = 'csdn'
+FILE_NAME = os.getenv('PCFG_DATASET', FILE_NAME).lower()
 FILE_PATH = f"./data/data_{FILE_NAME}.pkl"
+COUNTS_PATH = f"./{FILE_NAME}/rule_counts.pkl"
 TOTAL_COUNT = None
 
-def generate_char_rule(passwords):
-    char_rule = {}
-    pattern = re.compile(r'([a-z]+)')
-    bar = Bar(title="generate char rules", max=len(passwords))
-    for password in passwords:
-        chars = pattern.findall(password) # ['123', '321']
-        for char in chars:
-            if(char not in char_rule):
-                char_rule[char] = 0
-            char_rule[char] += 1
-        bar.next()
-    bar.finish()
-    total_count = len(passwords)
-    sorted_dict = sorted(char_rule.items(), key=lambda item: item[1], reverse=True)
-    with open(f'./{FILE_NAME}/char_rule.txt', 'w', encoding='utf-8', errors='ignore') as f:
+def _merge_counts(rule, counts):
+    # counts 按首次出现的顺序排列，新键依次追加，与逐条累加时字典的插入顺序一致
+    for key, count in counts.items():
+        if(key not in rule):
+            rule[key] = 0
+        rule[key] += count
+    return rule
+
+
+def _weighted_counts(keys, weights):
+    """keys[i] 计 weights[i] 次，一次 np.unique + bincount 求和；
+    结果按键首次出现的顺序排列，与 Counter(keys) 的插入顺序一致"""
+    if not len(keys):
+        return Counter()
+    # object 数组按 Python 比较排序，不会像定长 S/U 类型那样截掉末尾的 \x00
+    uniques, first, inverse = np.unique(np.array(keys, dtype=object), return_index=True, return_inverse=True)
+    totals = np.bincount(inverse.ravel(), weights=weights, minlength=len(uniques))
+    order = np.argsort(first)
+    return Counter(dict(zip(uniques[order].tolist(), np.rint(totals[order]).astype(np.int64).tolist())))
+
+
+def count_tokens(pattern, passwords, weights=None):
+    """整批口令以换行拼接成一个缓冲区，只扫描一次；pattern 不能匹配换行。
+
+    weights 与 passwords 一一对应（去重口令的出现次数，见 password_structure.unique_counts），
+    每个片段按起始偏移在行首偏移上二分查找到所属口令，再按口令权重加权计数。
+    """
+    buffer = '\n'.join(passwords)
+    if weights is None:
+        return Counter(pattern.findall(buffer))
+    group = 1 if pattern.groups else 0
+    matches = list(pattern.finditer(buffer))
+    tokens = [m[group] for m in matches]
+    starts = np.fromiter((m.start() for m in matches), dtype=np.int64, count=len(matches))
+    lengths = np.fromiter(map(len, passwords), dtype=np.int64, count=len(passwords))
+    line_starts = np.concatenate(([0], np.cumsum(lengths[:-1] + 1)))
+    lines = np.searchsorted(line_starts, starts, side='right') - 1
+    return _weighted_counts(tokens, np.asarray(weights)[lines])
+
+
+def count_char_rule(passwords, char_rule=None, weights=None):
+    if char_rule is None:
+        char_rule = {}
+    counts = count_tokens(re.compile(r'([a-z]+)'), passwords, weights) # '123abc321' -> ['abc']
+    return _merge_counts(char_rule, counts)
+
+
+def count_number_rule(passwords, number_rule=None, weights=None):
+    if number_rule is None:
+        number_rule = {}
+    counts = count_tokens(re.compile(r'(\d+)'), passwords, weights) # '123abc321' -> ['123', '321']
+    return _merge_counts(number_rule, counts)
+
+
+def count_pattern_rule(passwords, pattern_rule=None, weights=None):
+    if pattern_rule is None:
+        pattern_rule = {}
+    # 整批求类别码串，再按不同的类别码串计数，结构只对每种类别码串求一次
+    codes = batch_codes(passwords, PCFG_CLASSES)
+    counts = Counter(codes) if weights is None else _weighted_counts(codes, weights)
+    for code, count in counts.items():
+        # '123abc321' -> 'D,3,L,3,D,3,'
+        pattern = structure_of(code, PCFG_CLASSES, '{},{},', skip='S')[0]
+        if(pattern not in pattern_rule):
+            pattern_rule[pattern] = 0
+        pattern_rule[pattern] += count
+    return pattern_rule
+
+
+def write_rule(filename, rule, total_count, strip_comma=False):
+    # 先过滤再排序：sorted 是稳定排序，与整体排序后截断的结果逐字节一致
+    kept = [item for item in rule.items() if item[1] > 8]
+    sorted_dict = sorted(kept, key=lambda item: item[1], reverse=True)
+    with open(filename, 'w', encoding='utf-8', errors='ignore') as f:
         for item in sorted_dict:
             key, value = item
-            if(value <= 8):
-                break
+            if strip_comma:
+                key = key[:-1] # 去除末尾的逗号
             value = float(value) / float(total_count)
             f.write(f'{key} {value:.5f}\n')
 
 
+def generate_char_rule(passwords):
+    uniques, counts = unique_counts(passwords)
+    char_rule = count_char_rule(uniques, weights=counts)
+    write_rule(f'./{FILE_NAME}/char_rule.txt', char_rule, len(passwords))
+
+
 def generate_number_rule(passwords):
-    number_rule = {}
-    pattern = re.compile(r'(\d+)')
-
-    bar = Bar(title="generate number rules", max=len(passwords))
-
-    for password in passwords:
-        numbers = pattern.findall(password) # ['123', '321']
-        for number in numbers:
-            if(number not in number_rule):
-                number_rule[number] = 0
-            number_rule[number] += 1
-        bar.next()
-    bar.finish()
-    total_count = len(passwords)
-    sorted_dict = sorted(number_rule.items(), key=lambda item: item[1], reverse=True)
-    with open(f'./{FILE_NAME}/number_rule.txt', 'w', encoding='utf-8', errors='ignore') as f:
-        for item in sorted_dict:
-            key, value = item
-            if(value <= 8):
-                break
-            value = float(value) / float(total_count)
-            f.write(f'{key} {value:.5f}\n')
+    uniques, counts = unique_counts(passwords)
+    number_rule = count_number_rule(uniques, weights=counts)
+    write_rule(f'./{FILE_NAME}/number_rule.txt', number_rule, len(passwords))
 
 
 def generate_pattern_rule(passwords):
-    pattern_rule = {}
-    repattern = re.compile(r'([0-9]+|[a-z]+)')
-    bar = Bar(title="generate pattern rules", max=len(passwords))
-    for password in passwords:
-        item_patterns = repattern.findall(password) # ['123', 'abc', '321']
-        pattern = ''
-        for itme_pattern in item_patterns:
-            itme_pattern_key = 'L' if itme_pattern[0] in string.ascii_lowercase else 'D'
-            itme_pattern_len = len(itme_pattern)
-            pattern += '{},{},'.format(itme_pattern_key, itme_pattern_len)
-        if(pattern not in pattern_rule):
-            pattern_rule[pattern] = 0
-        pattern_rule[pattern] += 1
-        bar.next()
-    bar.finish()
+    uniques, counts = unique_counts(passwords)
+    pattern_rule = count_pattern_rule(uniques, weights=counts)
+    write_rule(f'./{FILE_NAME}/pattern_rule.txt', pattern_rule, len(passwords), strip_comma=True)
+
+
+class RuleCounts:
+    """可增量合并的规则计数：保存原始计数与口令总数，按需重新输出三个规则文件
+
+    字典保持首次出现的顺序，因此先后合并多个批次与对拼接后的数据整体计数，
+    输出的规则文件完全一致，新增批次的代价只与该批次的大小成正比。
+    """
+
+    def __init__(self):
+        self.char_rule = {}
+        self.number_rule = {}
+        self.pattern_rule = {}
+        self.total_count = 0
+
+    @classmethod
+    def load(cls, path):
+        """读取 save() 保存的计数；文件不存在时抛出 FileNotFoundError"""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        counts = cls()
+        counts.char_rule = data['char_rule']
+        counts.number_rule = data['number_rule']
+        counts.pattern_rule = data['pattern_rule']
+        counts.total_count = data['total_count']
+        return counts
+
+    def save(self, path):
+        # 只保存内置类型，从任何入口加载都不依赖本类所在的模块名
+        data = {
+            'char_rule': self.char_rule,
+            'number_rule': self.number_rule,
+            'pattern_rule': self.pattern_rule,
+            'total_count': self.total_count,
+        }
+        with open(path, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+    def add_batch(self, passwords):
+        # 先压缩为 (去重口令, 次数)，三类规则都只对每个不同口令计算一次
+        with stage('generate_rules.unique', items=len(passwords)) as st:
+            uniques, counts = unique_counts(passwords)
+            st.count('unique', len(uniques))
+        with stage('generate_rules.char', items=len(uniques)):
+            count_char_rule(uniques, self.char_rule, counts)
+        with stage('generate_rules.number', items=len(uniques)):
+            count_number_rule(uniques, self.number_rule, counts)
+        with stage('generate_rules.pattern', items=len(uniques)):
+            count_pattern_rule(uniques, self.pattern_rule, counts)
+        self.total_count += len(passwords)
+
+    def write_rules(self, rule_dir):
+        write_rule(os.path.join(rule_dir, 'char_rule.txt'), self.char_rule, self.total_count)
+        write_rule(os.path.join(rule_dir, 'number_rule.txt'), self.number_rule, self.total_count)
+        write_rule(os.path.join(rule_dir, 'pattern_rule.txt'), self.pattern_rule, self.total_count, strip_comma=True)
 
-    total_count = len(passwords)
-    sorted_dict = sorted(pattern_rule.items(), key=lambda item: item[1], reverse=True)
-    with open(f'./{FILE_NAME}/pattern_rule.txt', 'w', encoding='utf-8', errors='ignore') as f:
-        for item in sorted_dict:
-            key, value = item
-            key = key[:-1] # 去除末尾的逗号
-            if(value <= 8):
-                break
-            value = float(value) / total_count
-            f.write(f'{key} {value:.5f}\n')
-            
 
+def read_batch(path):
+    # 新增的泄露切片：每行一条口令，按 split_data 的规则过滤
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        passwords = [line.strip() for line in f]
+    filtered, _ = _filter_data(passwords)
+    return filtered
 
 
 def main():
-    train_data, _ = load_data(FILE_PATH)
+    parser = argparse.ArgumentParser(description='generate char/number/pattern rules')
+    parser.add_argument('--add', metavar='FILE', action='append',
+                        help='将新的口令批次（每行一条）合并进已保存的计数并重写规则文件')
+    args = parser.parse_args()
 
-    generate_char_rule(train_data)
-    generate_number_rule(train_data)
-    generate_pattern_rule(train_data)
+    if args.add:
+        if os.path.exists(COUNTS_PATH):
+            counts = RuleCounts.load(COUNTS_PATH)
+        elif os.path.exists(FILE_PATH):
+            # 尚未保存过计数：先用训练集重建，避免只用新批次覆盖现有规则文件
+            train_data, _ = load_data(FILE_PATH)
+            counts = RuleCounts()
+            counts.add_batch(train_data)
+        else:
+            raise FileNotFoundError(f'{COUNTS_PATH} 与 {FILE_PATH} 都不存在，无法增量合并；请先完整运行一次 generate_rules.py')
+        for path in args.add:
+            counts.add_batch(read_batch(path))
+    else:
+        train_data, _ = load_data(FILE_PATH)
+        counts = RuleCounts()
+        counts.add_batch(train_data)
+    counts.write_rules(f'./{FILE_NAME}')
+    counts.save(COUNTS_PATH)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
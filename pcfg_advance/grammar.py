@@ -0,0 +1,183 @@
+import math
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from password_structure import PCFG_CLASSES, batch_codes, structure, structure_of
+
+
+class AliasTable:
+    """Vose 别名表：O(k) 构建，之后每次抽样只需一次均匀整数与一次均匀实数"""
+
+    def __init__(self, probs):
+        probs = np.asarray(probs, dtype=np.float64)
+        k = len(probs)
+        scaled = (probs * k / probs.sum()).tolist()
+        self.size = k
+        self.prob = np.ones(k)
+        self.alias = np.arange(k, dtype=np.int64)
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # 剩余项的概率因浮点误差略偏离 1，直接视为 1
+
+    def sample(self, rng, size):
+        idx = rng.integers(0, self.size, size)
+        return np.where(rng.random(size) < self.prob[idx], idx, self.alias[idx])
+
+
+class Grammar:
+    """归一化后的 PCFG 文法：P(口令) = P(模式) * ∏ P(片段 | 类别, 长度)
+
+    规则文件中的概率是“出现次数 / 训练口令总数”，这里把模式概率在可生成的模式上归一化，
+    字母/数字片段在各自 (类别, 长度) 的表内归一化，得到一个真正的概率分布，可以抽样。
+    片段均为同类字符的最长游程，因此每个口令至多只有一种推导，parse() 的结果唯一。
+
+    注意这与 PCFG.generate()/iter_generate() 的实际输出顺序不同：生成时只按片段概率的乘积排序，
+    不乘模式概率，并且按数据集的 limit 截断每个模式的候选。基于本文法的概率与猜测数描述的是
+    归一化模型下的理想猜测顺序，而不是口令在 *_genpwds.txt 中的行号（后者见 rank_index.py）。
+    """
+
+    def __init__(self, pattern_rules, rule_char, rule_number):
+        self.tables = {}
+        for key, rule in (('L', rule_char), ('D', rule_number)):
+            for length, items in rule.items():
+                # 规则文件只保留 5 位小数，概率为 0 的条目既无法抽到也不影响排序，直接略去
+                items = [item for item in items if item[1] > 0]
+                total = sum(item[1] for item in items)
+                if items:
+                    terms = [item[0] for item in items]
+                    probs = np.array([item[1] for item in items]) / total
+                    self.tables[(key, length)] = (terms, probs, dict(zip(terms, probs.tolist())))
+
+        # 只保留每个片段都有规则可用的模式，与 generate() 实际能产出的候选一致
+        self.patterns = []
+        weights = []
+        for rule in pattern_rules:
+            pattern = tuple((key, int(length)) for key, length in rule[:-1])
+            if float(rule[-1]) > 0 and pattern and all(segment in self.tables for segment in pattern):
+                self.patterns.append(pattern)
+                weights.append(float(rule[-1]))
+        if not self.patterns:
+            raise ValueError('文法中没有可生成口令的模式')
+        self.pattern_probs = np.array(weights) / sum(weights)
+        self.pattern_index = {pattern: i for i, pattern in enumerate(self.patterns)}
+        self._pattern_alias = AliasTable(self.pattern_probs)
+        self._term_alias = {}
+
+    @classmethod
+    def from_pcfg(cls, pcfg):
+        """由已加载规则的 PCFG 实例构造，只包含 _active_rules() 选中的模式"""
+        rules = [list(patterns) + [p] for patterns, p, _ in pcfg._active_rules()]
+        return cls(rules, pcfg.rule_char, pcfg.rule_number)
+
+    def parse(self, password):
+        """'abc123' -> ((('L', 3), ('D', 3)), ('abc', '123'))；含文法无法生成的字符时返回 None"""
+        _, runs = structure(password, PCFG_CLASSES)
+        if not runs or any(key == 'S' for key, _, _ in runs):
+            return None
+        pattern = tuple((key, end - start) for key, start, end in runs)
+        terms = tuple(password[start:end] for _, start, end in runs)
+        return pattern, terms
+
+    def log_prob(self, password):
+        """口令在文法下的自然对数概率，无法生成时为 -inf"""
+        parsed = self.parse(password)
+        if parsed is None:
+            return -math.inf
+        pattern, terms = parsed
+        idx = self.pattern_index.get(pattern)
+        if idx is None:
+            return -math.inf
+        logp = math.log(self.pattern_probs[idx])
+        for segment, term in zip(pattern, terms):
+            p = self.tables[segment][2].get(term)
+            if p is None:
+                return -math.inf
+            logp += math.log(p)
+        return logp
+
+    def _parse_code(self, code):
+        # 类别码串 -> (模式的对数概率, [(片段概率表, 起点, 终点), ...])，无法生成时为 None
+        _, runs = structure_of(code, PCFG_CLASSES)
+        if not runs or any(key == 'S' for key, _, _ in runs):
+            return None
+        pattern = tuple((key, end - start) for key, start, end in runs)
+        idx = self.pattern_index.get(pattern)
+        if idx is None:
+            return None
+        return math.log(self.pattern_probs[idx]), [(self.tables[segment][2], start, end) for segment, (_, start, end) in zip(pattern, runs)]
+
+    def log_probs(self, passwords):
+        """批量版 log_prob()，返回 np.ndarray
+
+        类别码整批求出，模式解析只对每种类别码串做一次，逐口令只剩片段的 dict 查询。
+        """
+        passwords = list(passwords)
+        res = np.full(len(passwords), -math.inf)
+        parsed = {}
+        for i, (password, code) in enumerate(zip(passwords, batch_codes(passwords, PCFG_CLASSES))):
+            if code not in parsed:
+                parsed[code] = self._parse_code(code)
+            entry = parsed[code]
+            if entry is None:
+                continue
+            logp, spans = entry
+            for table, start, end in spans:
+                p = table.get(password[start:end])
+                if p is None:
+                    logp = -math.inf
+                    break
+                logp += math.log(p)
+            res[i] = logp
+        return res
+
+    def prob(self, password):
+        return math.exp(self.log_prob(password))
+
+    def _alias(self, segment):
+        table = self._term_alias.get(segment)
+        if table is None:
+            table = self._term_alias[segment] = AliasTable(self.tables[segment][1])
+        return table
+
+    def sample_log_probs(self, n, rng=None):
+        """从文法中独立抽取 n 个口令，只返回它们的对数概率（无需拼出字符串）"""
+        rng = np.random.default_rng(rng)
+        idx = self._pattern_alias.sample(rng, n)
+        logp = np.log(self.pattern_probs)[idx]
+        # 按模式分组，每组的每个片段一次向量化抽样
+        order = np.argsort(idx, kind='stable')
+        counts = np.bincount(idx, minlength=len(self.patterns))
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        for i in np.flatnonzero(counts):
+            rows = order[bounds[i]:bounds[i + 1]]
+            for segment in self.patterns[i]:
+                picks = self._alias(segment).sample(rng, len(rows))
+                logp[rows] += np.log(self.tables[segment][1][picks])
+        return logp
+
+    def sample(self, n, rng=None):
+        """抽取 n 个 (口令, 概率)，便于人工检查文法"""
+        rng = np.random.default_rng(rng)
+        res = []
+        for i in self._pattern_alias.sample(rng, n):
+            pwd = ''
+            p = self.pattern_probs[i]
+            for segment in self.patterns[i]:
+                terms, probs, _ = self.tables[segment]
+                j = self._alias(segment).sample(rng, 1)[0]
+                pwd += terms[j]
+                p *= probs[j]
+            res.append([pwd, float(p)])
+        return res
@@ -0,0 +1,262 @@
+import argparse
+import os
+import sys
+import numpy as np
+from test import BASE_DIR, DATA_DIR, FILE_NAME, pipelined_test
+from utils import load_data
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+from password_structure import unique_counts
+
+GUESS_COUNT = 200000
+ORDER = 4
+MAX_LEVEL = 10
+SMOOTHING = 0.01
+# n-gram 编号为 alphabet ** order 以内的整数，需能放进 int64
+MAX_GRAM_ID = 1 << 62
+
+
+class MarkovModel:
+    """OMEN 式的 n-gram 口令模型（Dürmuth et al., ESSoS 2015）
+
+    口令 = 长度 ℓ + 前 n-1 个字符（initial prob）+ 逐字符的条件概率 P(c | 前 n-1 个字符)。
+    每个概率量化为整数等级 level = round(-ln p)，截断到 [0, max_level]，口令的等级为各项之和。
+    枚举时按总等级 η = 0, 1, 2, ... 逐级进行，每一级对每个长度做深度优先搜索，只需整数加减；
+    (上下文, 剩余位置) 能凑出的等级和记为一个位掩码并缓存，凑不出剩余等级的分支直接跳过，
+    因此搜索到的每个节点都至少产出一个口令。同一等级内的先后顺序不作保证。
+
+    计数稀疏存储：转移只保存出现过的 (上下文, 字符) 对，按上下文排序成 CSR 形式的数组，
+    某个上下文的后继分布在搜索首次到达时才展开（未出现的上下文共用同一个均匀分布），
+    因此内存只与训练数据中不同 n-gram 的个数有关，与 alphabet ** order 无关。
+    初始前缀只枚举训练集中出现过的（未出现的前缀平滑后的概率极低，默认参数下本就处于最高等级）。
+
+    与 PCFG 不同，终结符不受规则表“出现次数 > 8”的截断限制，任何字符组合都可能被生成。
+    """
+
+    def __init__(self, order=ORDER, max_level=MAX_LEVEL, smoothing=SMOOTHING):
+        if order < 2:
+            raise ValueError('order 至少为 2')
+        self.order = order
+        self.max_level = max_level
+        self.smoothing = smoothing
+        self._rows = {}
+        self._reach = {}
+
+    def fit(self, passwords, weights=None):
+        """按 (口令, 次数) 统计长度、前缀与 n-gram：n-gram 编码为整数后用 np.unique 合并计数"""
+        k = self.order - 1
+        if weights is None:
+            passwords, weights = unique_counts(passwords)
+        pairs = [(pwd, w) for pwd, w in zip(passwords, weights) if len(pwd) >= k]
+        if not pairs:
+            raise ValueError('没有长度不少于 order - 1 的训练口令')
+        words = [pwd for pwd, _ in pairs]
+        weights = np.array([w for _, w in pairs], dtype=np.float64)
+
+        # 定长 Unicode 数组的每个元素即码位，np.unique 把码位映射为 0..A-1 的字母表下标（0 为补齐）
+        codes = np.array(words, dtype=f'U{max(len(pwd) for pwd in words)}')
+        codes = codes.view(np.uint32).reshape(len(words), -1)
+        symbols, inverse = np.unique(codes, return_inverse=True)
+        inverse = inverse.reshape(codes.shape)
+        if symbols[0] == 0:
+            symbols, inverse = symbols[1:], inverse - 1
+        self.alphabet = [chr(code) for code in symbols]
+        A = len(self.alphabet)
+        if A ** self.order >= MAX_GRAM_ID:
+            raise ValueError(f'字母表大小 {A} 与 order={self.order} 的 n-gram 编号超出 int64')
+        self.size = A
+        self.contexts = A ** k
+        lengths = np.array([len(pwd) for pwd in words])
+
+        self.length_counts = np.zeros(lengths.max() + 1)
+        np.add.at(self.length_counts, lengths, weights)
+
+        prefix = np.zeros(len(words), dtype=np.int64)
+        for j in range(k):
+            prefix = prefix * A + inverse[:, j]
+        self.ip_ids, self.ip_counts = self._sum_by_key(prefix, weights)
+
+        # 逐列合并 (上下文 * A + 字符) 的计数，最后再整体合并一次
+        key_parts = []
+        count_parts = []
+        context = prefix
+        for j in range(k, inverse.shape[1]):
+            valid = lengths > j
+            keys, counts = self._sum_by_key(context[valid] * A + inverse[valid, j], weights[valid])
+            key_parts.append(keys)
+            count_parts.append(counts)
+            context = (context * A + inverse[:, j]) % self.contexts
+        if key_parts:
+            keys, counts = self._sum_by_key(np.concatenate(key_parts), np.concatenate(count_parts))
+        else:
+            keys, counts = np.zeros(0, dtype=np.int64), np.zeros(0)
+        # CSR：ctx_ids 为出现过的上下文（升序），第 r 个上下文的后继为 cp_next[indptr[r]:indptr[r + 1]]
+        self.ctx_ids, starts = np.unique(keys // A, return_index=True)
+        self.indptr = np.append(starts, len(keys))
+        self.cp_next = keys % A
+        self.cp_counts = counts
+        self.ctx_totals = np.add.reduceat(counts, starts) if len(keys) else np.zeros(0)
+        self._quantize()
+        return self
+
+    @staticmethod
+    def _sum_by_key(keys, weights):
+        # 相同键的权重求和，返回 (升序的不同键, 权重和)
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        return uniques, np.bincount(inverse.ravel(), weights=weights, minlength=len(uniques))
+
+    def _quantize(self):
+        delta = self.smoothing
+        self.length_probs = self.length_counts / self.length_counts.sum()
+        # 平滑时仍按全部 A ** k 个前缀归一化，出现过的前缀概率与稠密计数时相同
+        self.ip_probs = (self.ip_counts + delta) / (self.ip_counts.sum() + delta * self.contexts)
+        self.length_levels = self._levels(self.length_probs)
+        self.ip_levels = self._levels(self.ip_probs)
+        # 初始前缀按等级分组：groups[level] = [(前缀编号, 概率), ...]
+        self._ip_groups = [[] for _ in range(self.max_level + 1)]
+        for ip_id, p, level in zip(self.ip_ids.tolist(), self.ip_probs.tolist(), self.ip_levels.tolist()):
+            self._ip_groups[level].append((ip_id, p))
+        self._rows = {}
+        self._reach = {}
+        self._uniform_row = None
+
+    def _levels(self, probs):
+        with np.errstate(divide='ignore'):
+            levels = np.rint(-np.log(probs))
+        return np.clip(levels, 0, self.max_level).astype(np.int64)
+
+    def _cp_probs(self, context):
+        # 上下文的后继分布 (n_c + δ) / (N + δA)；未出现的上下文为均匀分布
+        r = int(np.searchsorted(self.ctx_ids, context))
+        if r == len(self.ctx_ids) or self.ctx_ids[r] != context:
+            return None
+        denom = self.ctx_totals[r] + self.smoothing * self.size
+        probs = np.full(self.size, self.smoothing / denom)
+        start, end = self.indptr[r], self.indptr[r + 1]
+        probs[self.cp_next[start:end]] += self.cp_counts[start:end] / denom
+        return probs
+
+    def _group(self, probs):
+        levels = self._levels(probs).tolist()
+        row = [[] for _ in range(self.max_level + 1)]
+        for c in np.argsort(-probs, kind='stable').tolist():
+            row[levels[c]].append((c, float(probs[c])))
+        return row
+
+    def _row(self, context):
+        # 某个上下文的后继字符按等级分组：groups[level] = [(字符下标, 概率), ...]
+        row = self._rows.get(context)
+        if row is None:
+            probs = self._cp_probs(context)
+            if probs is None:
+                if self._uniform_row is None:
+                    self._uniform_row = self._group(np.full(self.size, 1.0 / self.size))
+                row = self._uniform_row
+            else:
+                row = self._group(probs)
+            self._rows[context] = row
+        return row
+
+    def _reachable(self, context, left):
+        # 从 context 出发再追加 left 个字符能凑出的等级和：第 b 位为 1 表示和 b 可达
+        row = self._row(context)
+        if row is self._uniform_row:
+            # 未出现的上下文共用均匀分布，可达等级只取决于决定后继的后 k-1 个字符
+            key = (context % self.size ** (self.order - 2), left, True)
+        else:
+            key = (context, left)
+        mask = self._reach.get(key)
+        if mask is None:
+            mask = 0
+            if left == 1:
+                for level, chars in enumerate(row):
+                    if chars:
+                        mask |= 1 << level
+            else:
+                modulus = self.size ** (self.order - 1)
+                for level, chars in enumerate(row):
+                    for c, _ in chars:
+                        mask |= self._reachable((context * self.size + c) % modulus, left - 1) << level
+            self._reach[key] = mask
+        return mask
+
+    def _prefix(self, index):
+        chars = []
+        for _ in range(self.order - 1):
+            index, c = divmod(index, self.size)
+            chars.append(self.alphabet[c])
+        return ''.join(reversed(chars))
+
+    def _extend(self, pwd, p, context, budget, left):
+        # 还需追加 left 个字符，且这些字符的等级之和恰好为 budget
+        row = self._row(context)
+        modulus = self.size ** (self.order - 1)
+        if left == 1:
+            if budget <= self.max_level:
+                for c, q in row[budget]:
+                    yield [pwd + self.alphabet[c], p * q]
+            return
+        for level in range(min(budget, self.max_level) + 1):
+            rest = budget - level
+            if rest > (left - 1) * self.max_level:
+                continue
+            for c, q in row[level]:
+                nxt = (context * self.size + c) % modulus
+                if self._reachable(nxt, left - 1) >> rest & 1:
+                    yield from self._extend(pwd + self.alphabet[c], p * q, nxt, rest, left - 1)
+
+    def iter_level(self, level):
+        """产出总等级恰好为 level 的全部口令 [口令, 概率]"""
+        k = self.order - 1
+        for length in np.flatnonzero(self.length_counts).tolist():
+            budget = level - int(self.length_levels[length])
+            if budget < 0:
+                continue
+            left = length - k
+            for ip_level in range(min(budget, self.max_level) + 1):
+                rest = budget - ip_level
+                if rest > left * self.max_level:
+                    continue
+                for index, ip_prob in self._ip_groups[ip_level]:
+                    if left and not self._reachable(index, left) >> rest & 1:
+                        continue
+                    pwd = self._prefix(index)
+                    p = float(self.length_probs[length]) * ip_prob
+                    if left == 0:
+                        if rest == 0:
+                            yield [pwd, p]
+                    else:
+                        yield from self._extend(pwd, p, index, rest, left)
+
+    def max_total_level(self):
+        longest = len(self.length_counts) - 1
+        return self.max_level * (longest - self.order + 3)
+
+    def iter_generate(self):
+        """按总等级从低到高惰性产出 [口令, 概率]，可直接交给 test.pipelined_test"""
+        for level in range(self.max_total_level() + 1):
+            yield from self.iter_level(level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OMEN-style Markov guess generator evaluated like pcfg.advance.py')
+    parser.add_argument('--order', type=int, default=ORDER, help='n-gram 阶数（上下文为 n-1 个字符）')
+    parser.add_argument('--max-level', type=int, default=MAX_LEVEL)
+    parser.add_argument('--smoothing', type=float, default=SMOOTHING, help='加性平滑系数')
+    parser.add_argument('--guesses', type=int, default=GUESS_COUNT)
+    args = parser.parse_args()
+
+    train_data, _ = load_data(os.path.join(DATA_DIR, f'data_{FILE_NAME}.pkl'))
+    with stage('markov.train', items=len(train_data)):
+        uniques, counts = unique_counts(train_data)
+        model = MarkovModel(args.order, args.max_level, args.smoothing).fit(uniques, counts)
+    with open(os.path.join(BASE_DIR, 'res.txt'), 'a', encoding='utf-8') as f:
+        f.write('{}, markov(order={}, levels={}), result = '.format(FILE_NAME, args.order, args.max_level))
+    with open(os.path.join(BASE_DIR, 'info.txt'), 'a', encoding='utf-8') as f:
+        f.write('{}, markov(order={}, levels={}), infos:\n'.format(FILE_NAME, args.order, args.max_level))
+    pipelined_test(FILE_NAME, model.iter_generate(), max_guesses=args.guesses, engine='markov')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import collections
+import heapq
+import os
+import sys
+from test import BASE_DIR, pipelined_test
+from utils import load_pcfg_module
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+
+GUESS_COUNT = 200000
+# 去重只记住最近产出的 SEEN_LIMIT 条口令
+SEEN_LIMIT = 2000000
+DEFAULT_CHAR_RULE = 'char_lib.txt'
+# 组件来源写作 tokens 时只取用户名 token 候选
+TOKENS = 'tokens'
+
+
+def parse_component(spec):
+    """'csdn:char_rule.txt=0.6' -> (名称, 数据集, 字符规则文件或 tokens, 权重)，权重省略时为 1"""
+    name, _, weight = spec.partition('=')
+    dataset, _, source = name.partition(':')
+    return name, dataset.lower(), source or DEFAULT_CHAR_RULE, float(weight) if weight else 1.0
+
+
+def build_components(pcfg_module, specs):
+    """按组件说明构造 (名称, 权重, 口令流)，每个组件是一个独立的 PCFG 实例
+
+    文法组件不含用户名 token 候选，需要时单独写一个 DATASET:tokens 组件，便于分别比较。
+    """
+    components = []
+    for spec in specs:
+        name, dataset, source, weight = parse_component(spec)
+        if source == TOKENS:
+            pcfg = pcfg_module.PCFG(record=False, dataset=dataset)
+            if not pcfg.username_tokens:
+                pcfg.username_tokens = pcfg.load_username_tokens(pcfg.username_token_path)
+            stream = pcfg._iter_username_token_candidates()
+        else:
+            pcfg = pcfg_module.PCFG(char_rule_filename=source, record=False, dataset=dataset)
+            pcfg.enable_username_tokens = False
+            stream = pcfg.iter_generate()
+        components.append((name, weight, stream))
+    return components
+
+
+class Mixture:
+    """把多个按概率降序的口令流按权重混合成一个降序流
+
+    权重归一化后，组件 i 的口令以 w_i · P_i(x) 参与 heapq.merge 归并，各组件的输出都是惰性产出的。
+    同一口令只保留最先出现（即加权概率最大）的一次，排序依据为 max_i w_i · P_i(x)，
+    而不是严格的混合概率 Σ w_i · P_i(x)。去重窗口有界：相隔超过 seen_limit 条的重复口令会再次产出。
+    """
+
+    def __init__(self, components, seen_limit=SEEN_LIMIT):
+        total = sum(weight for _, weight, _ in components)
+        if total <= 0:
+            raise ValueError('组件权重之和必须为正')
+        self.components = [(name, weight / total, stream) for name, weight, stream in components]
+        self.seen_limit = seen_limit
+        # 各组件实际产出（去重后）的口令数与被丢弃的重复数
+        self.emitted = collections.Counter()
+        self.duplicates = 0
+
+    @staticmethod
+    def _weighted(index, weight, stream):
+        for guess in stream:
+            yield guess[0], guess[1] * weight, index
+
+    def __iter__(self):
+        streams = [self._weighted(i, weight, stream) for i, (_, weight, stream) in enumerate(self.components) if weight > 0]
+        merged = heapq.merge(*streams, key=lambda item: item[1], reverse=True)
+        seen = set()
+        recent = collections.deque()
+        for pwd, p, index in merged:
+            if pwd in seen:
+                self.duplicates += 1
+                continue
+            seen.add(pwd)
+            recent.append(pwd)
+            if len(recent) > self.seen_limit:
+                seen.discard(recent.popleft())
+            self.emitted[self.components[index][0]] += 1
+            yield [pwd, p]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='merge several weighted grammars into one ranked guess stream')
+    parser.add_argument('components', nargs='+', help='DATASET[:CHAR_RULE_FILE|:tokens][=WEIGHT]，如 csdn:char_lib.txt=0.6 yahoo=0.3 csdn:tokens=0.1')
+    parser.add_argument('--guesses', type=int, default=GUESS_COUNT)
+    parser.add_argument('--seen-limit', type=int, default=SEEN_LIMIT, help='去重窗口大小')
+    args = parser.parse_args()
+
+    pcfg_module = load_pcfg_module()
+    file_name = pcfg_module.FILE_NAME
+    with stage('mixture.load', items=len(args.components)):
+        mixture = Mixture(build_components(pcfg_module, args.components), args.seen_limit)
+    label = 'mixture({})'.format(' '.join(args.components))
+    with open(os.path.join(BASE_DIR, 'res.txt'), 'a', encoding='utf-8') as f:
+        f.write('{}, {}, result = '.format(file_name, label))
+    with open(os.path.join(BASE_DIR, 'info.txt'), 'a', encoding='utf-8') as f:
+        f.write('{}, {}, infos:\n'.format(file_name, label))
+    pipelined_test(file_name, mixture, max_guesses=args.guesses, engine='mixture')
+    for name, weight, _ in mixture.components:
+        print(f'{name} (w={weight:.3f}): {mixture.emitted[name]} guesses')
+    print(f'duplicates dropped: {mixture.duplicates}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import heapq
+import itertools
+import multiprocessing
+
+# 子进程内的 PCFG 实例：fork 时直接继承父进程的只读规则表，spawn 时由 initializer 反序列化一次
+_WORKER_PCFG = None
+
+
+def _init_worker(pcfg):
+    global _WORKER_PCFG
+    _WORKER_PCFG = pcfg
+
+
+def _generate_shard(args):
+    shard, top_k = args
+    pcfg = _WORKER_PCFG
+    pcfg._plan_tails(shard)
+    streams = []
+    for patterns, p, limit in shard:
+        pcfg.limit = limit
+        streams.append(pcfg._iter_by_pattern(patterns, p))
+    merged = heapq.merge(*streams, key=lambda item: item[1], reverse=True)
+    return list(itertools.islice(merged, top_k))
+
+
+def partition_rules(rules, workers, estimate, top_k):
+    """按估算的候选规模将模式均衡地分配到 workers 个分片（LPT 贪心）
+
+    每个模式最多贡献 top_k 条口令，因此估算值以 top_k 封顶。
+    """
+    weighted = sorted(((min(estimate(patterns, limit), top_k), idx) for idx, (patterns, _, limit) in enumerate(rules)), reverse=True)
+    loads = [(0, i) for i in range(workers)]
+    shards = [[] for _ in range(workers)]
+    for weight, idx in weighted:
+        load, i = heapq.heappop(loads)
+        shards[i].append(rules[idx])
+        heapq.heappush(loads, (load + weight, i))
+    return [shard for shard in shards if shard]
+
+
+def parallel_generate(pcfg, rules, workers, top_k):
+    """多进程并行展开模式，每个进程返回本地前 top_k 条，再按概率归并"""
+    shards = partition_rules(rules, workers, pcfg._estimate_size, top_k)
+    if not shards:
+        return []
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with ctx.Pool(len(shards), initializer=_init_worker, initargs=(pcfg,)) as pool:
+        results = pool.map(_generate_shard, [(shard, top_k) for shard in shards])
+    merged = heapq.merge(*results, key=lambda item: item[1], reverse=True)
+    return list(itertools.islice(merged, top_k))
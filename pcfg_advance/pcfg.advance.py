@@ -1,16 +1,30 @@
 from tqdm import tqdm
 import itertools
+import heapq
 import gc
 import os
-from test import test
+import sys
+import numpy as np
+from test import test, pipelined_test
+from parallel import parallel_generate
+from tail_cache import TailCache
 from generate_rules import FILE_NAME as RULE_FILE_NAME
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage, timed
+from password_structure import PCFG_CLASSES, batch_codes, structure_of
+
 # Default dataset follows generate_rules unless overridden via env
 FILE_NAME = RULE_FILE_NAME if RULE_FILE_NAME else 'csdn'
 env_filename = os.getenv('PCFG_DATASET')
 if env_filename:
     FILE_NAME = env_filename.lower()
 FILE_PATH = f"./data/data_{FILE_NAME}.pkl"
+GUESS_COUNT = 200000
+# PCFG_PIPELINE=1 时边生成边撞库，不再落盘 *_genpwds.txt
+PIPELINE_MODE = os.getenv('PCFG_PIPELINE', '0').lower() not in ('0', 'false', 'off', 'no')
+# PCFG_WORKERS>1 时按模式分片多进程生成
+WORKERS = int(os.getenv('PCFG_WORKERS', '0'))
 
 def print_lst(lst):
 
@@ -24,14 +38,20 @@ def print_lst(lst):
 
 
 class PCFG:
-    def __init__(self,data_dir=f'./{FILE_NAME}', 
+    def __init__(self,data_dir=None, 
                 # char_rule_filename='char_rule.txt', 
                 char_rule_filename='char_lib.txt', 
                 number_rule_filename='number_rule.txt',
                 pattern_rule_filename='pattern_rule.txt',
-                username_token_filename=None):
+                username_token_filename=None,
+                record=True,
+                dataset=None):
 
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
+        # 数据集决定默认规则目录、递归深度策略与用户名 token 文件，默认取 FILE_NAME
+        self.dataset = dataset.lower() if dataset else FILE_NAME
+        if data_dir is None:
+            data_dir = f'./{self.dataset}'
         if not os.path.isabs(data_dir):
             data_dir = os.path.join(self.base_dir, data_dir)
         self.data_dir = data_dir
@@ -45,20 +65,31 @@ class PCFG:
 
         self.rule_char = self.get_rule(char_rule) # 长度与内容的映射
         self.rule_number = self.get_rule(number_rule)
+        # 跨长度按概率降序的全局索引，供用户名 token 组合等按需截取前 N 条
+        self.char_index = self._build_rule_index(self.rule_char)
+        self.number_index = self._build_rule_index(self.rule_number)
         self.username_tokens = []
         self.username_token_path = self._resolve_username_token_path(username_token_filename)
         if self.enable_username_tokens:
             self.username_tokens = self.load_username_tokens(self.username_token_path)
 
+        # score() 用的查找表，首次调用时构建
+        self._pattern_probs = None
+        self._terminal_probs = None
+        # 多个模式共享的尾部（如 ...,D,2）只展开一次
+        self.tail_cache = TailCache()
+
         self.limit = 1000
         self.username_token_limit = 50
         self.username_numeric_limit = 25
         self.username_char_limit = 25
 
-        with open(os.path.join(self.base_dir, 'res.txt'), 'a', encoding='utf-8') as f:
-            f.write('{}, {}, {}, result = '.format(FILE_NAME, char_rule_filename, number_rule_filename))
-        with open(os.path.join(self.base_dir, 'info.txt'), 'a', encoding='utf-8') as f:
-            f.write('{}, {}, {}, infos:\n'.format(FILE_NAME, char_rule_filename, number_rule_filename))
+        # record=False 时仅加载规则，不在 res.txt / info.txt 中登记本次实验
+        if record:
+            with open(os.path.join(self.base_dir, 'res.txt'), 'a', encoding='utf-8') as f:
+                f.write('{}, {}, {}, result = '.format(self.dataset, char_rule_filename, number_rule_filename))
+            with open(os.path.join(self.base_dir, 'info.txt'), 'a', encoding='utf-8') as f:
+                f.write('{}, {}, {}, infos:\n'.format(self.dataset, char_rule_filename, number_rule_filename))
 
     def _str2tuple(self, rule):
         pattern_str, p = rule
@@ -107,78 +138,222 @@ class PCFG:
         tokens.sort(key=lambda item: item[1], reverse=True)
         return tokens
 
-    def generate(self):
-        res = []
-        for rule in tqdm(self.pattern_rules):
+    def _active_rules(self):
+        """按数据集的递归深度策略筛选模式，产出 (patterns, p, limit)"""
+        for rule in self.pattern_rules:
             patterns = rule[:-1]
-            if(FILE_NAME == 'yahoo'):
-                if(len(patterns) == 3): self.limit = 100
-                elif(len(patterns) < 3): self.limit = 1000
+            if(self.dataset == 'yahoo'):
+                if(len(patterns) == 3): limit = 100
+                elif(len(patterns) < 3): limit = 1000
                 else: continue
-            elif(FILE_NAME == 'csdn'):
-                if(len(patterns) == 1): self.limit = 1000
-                elif(len(patterns) <= 3): self.limit = 100
+            elif(self.dataset == 'csdn'):
+                if(len(patterns) == 1): limit = 1000
+                elif(len(patterns) <= 3): limit = 100
                 else: continue
-            p = rule[-1]
-            gen_pwds = self._generate_by_pattern(patterns, p)
-            res.extend(gen_pwds)
+            else:
+                limit = self.limit
+            yield patterns, rule[-1], limit
+
+    def _plan_tails(self, rules):
+        """把各模式的尾部组织成后缀 DAG 并登记引用次数
+
+        每条规则引用一次自己的尾部 patterns[1:]；尾部只在首次展开时引用它的子尾部，
+        因此已登记过的尾部不再向下登记。
+        """
+        self.tail_cache.clear()
+        for patterns, _, limit in rules:
+            tail = tuple(patterns[1:])
+            while len(tail) > 1 and not self.tail_cache.plan((tail, limit)):
+                tail = tail[1:]
+
+    def generate(self):
+        res = []
+        with stage('pcfg.generate') as st:
+            rules = list(self._active_rules())
+            self._plan_tails(rules)
+            for patterns, p, limit in tqdm(rules):
+                self.limit = limit
+                gen_pwds = self._generate_by_pattern(patterns, p)
+                res.extend(gen_pwds)
 
-            del gen_pwds
-            gc.collect()
+                del gen_pwds
+                gc.collect()
+            if self.enable_username_tokens:
+                username_pwds = self._generate_username_token_candidates()
+                res.extend(username_pwds)
+            res.sort(key=lambda item : item[1], reverse=True)
+            st.add(len(res))
+            st.count('tail_cache.hits', self.tail_cache.hits)
+            st.count('tail_cache.misses', self.tail_cache.misses)
+        return res
+
+    def iter_generate(self):
+        """惰性地按概率降序产出 [口令, 概率]，候选集合与 generate() 一致
+
+        每个模式的候选由 _iter_by_pattern 以最大堆逐个弹出，再用 heapq.merge
+        做多路归并，因此无需生成并排序全部口令即可得到前 N 条。
+        """
+        streams = []
+        rules = list(self._active_rules())
+        self._plan_tails(rules)
+        for patterns, p, limit in rules:
+            self.limit = limit
+            streams.append(self._iter_by_pattern(patterns, p))
+        if self.enable_username_tokens:
+            streams.append(self._iter_username_token_candidates())
+        return heapq.merge(*streams, key=lambda item: item[1], reverse=True)
+
+    def generate_parallel(self, workers, top_k=GUESS_COUNT):
+        """多进程版 generate()，只保留概率最高的 top_k 条"""
+        rules = list(self._active_rules())
+        res = parallel_generate(self, rules, workers, top_k)
         if self.enable_username_tokens:
-            username_pwds = self._generate_username_token_candidates()
-            res.extend(username_pwds)
-        res.sort(key=lambda item : item[1], reverse=True)
+            username_pwds = self._iter_username_token_candidates()
+            merged = heapq.merge(res, username_pwds, key=lambda item: item[1], reverse=True)
+            res = list(itertools.islice(merged, top_k))
         return res
 
-    def _generate_by_pattern(self, patterns, p):
-        pattern = patterns[0]
-        key = pattern[0]
-        value = pattern[1]
-        try:
-            if key == "L":
-                first_pwds = self.rule_char[value]
-            elif key == "D":
-                first_pwds = self.rule_number[value]
-        except:
-            first_pwds = []
+    def _score_tables(self):
+        if self._pattern_probs is None:
+            self._pattern_probs = {tuple(rule[:-1]): float(rule[-1]) for rule in self.pattern_rules}
+            self._terminal_probs = {}
+            for key, rule_dict in (('L', self.rule_char), ('D', self.rule_number)):
+                for length, items in rule_dict.items():
+                    self._terminal_probs[(key, length)] = {content: p for content, p in items}
+        return self._pattern_probs, self._terminal_probs
+
+    def score(self, passwords, log=False):
+        """批量计算口令在规则表下的概率：P(模式) * ∏ P(片段)，返回与输入等长的 np.ndarray
+
+        切分方式与 generate_rules.count_pattern_rule 一致（小写字母/数字的最长游程），
+        模式与片段的概率直接取自规则表；含其它字符、模式或片段不在表中的口令概率为 0。
+        类别码串整批求出，结构与模式概率只对每种类别码串计算一次，逐口令只剩片段的 dict 查询。
+        log=True 时返回自然对数（概率为 0 记为 -inf）。
+        """
+        pattern_probs, terminal_probs = self._score_tables()
+        passwords = list(passwords)
+        parsed = {}
+        scores = []
+        for password, code in zip(passwords, batch_codes(passwords, PCFG_CLASSES)):
+            entry = parsed.get(code)
+            if entry is None:
+                _, runs = structure_of(code, PCFG_CLASSES, '{},{},', skip='S')
+                pattern = tuple((key, end - start) for key, start, end in runs)
+                # 符号会被切分忽略，但规则无法生成含符号的口令
+                covered = sum(end - start for _, start, end in runs) == len(code)
+                p = pattern_probs.get(pattern, 0.0) if covered else 0.0
+                spans = [(terminal_probs.get(segment, {}), start, end) for segment, (_, start, end) in zip(pattern, runs)]
+                entry = parsed[code] = (p, spans)
+            p, spans = entry
+            for table, start, end in spans:
+                if not p:
+                    break
+                p *= table.get(password[start:end], 0.0)
+            scores.append(p)
+        scores = np.array(scores, dtype=np.float64)
+        if log:
+            with np.errstate(divide='ignore'):
+                return np.log(scores)
+        return scores
+
+    def _estimate_size(self, patterns, limit):
+        # 与 _generate_by_pattern 的截断规则一致：首段截断为 limit，尾部整体截断为 limit
+        size = len(self._get_terminals(patterns[0]))
+        if(len(patterns) == 1):
+            return size
+        tail = 1
+        for pattern in patterns[1:]:
+            tail *= len(self._get_terminals(pattern))
+        return min(size, limit) * min(tail, limit)
 
+    def _iter_by_pattern(self, patterns, p):
+        # 立即按当前 self.limit 截断候选，返回的生成器不再依赖 self.limit
+        first_pwds = self._get_terminals(patterns[0])
+        if(len(patterns) == 1):
+            return iter(first_pwds)
+        last_pwds = sorted(self._expand_tail(tuple(patterns[1:])), key=lambda item: item[1], reverse=True)
+        return self._iter_product(first_pwds[:self.limit], last_pwds)
+
+    @staticmethod
+    def _iter_product(first_pwds, last_pwds):
+        """两个降序列表的笛卡尔积，按概率乘积降序逐个产出"""
+        if not first_pwds or not last_pwds:
+            return
+        heap = [(-first_pwds[0][1] * last_pwds[0][1], 0, 0)]
+        while heap:
+            neg_p, i, j = heapq.heappop(heap)
+            yield [first_pwds[i][0] + last_pwds[j][0], -neg_p]
+            # 每个 (i, j) 只会由 (i, j-1) 或 (i-1, 0) 入堆一次
+            if j + 1 < len(last_pwds):
+                heapq.heappush(heap, (-first_pwds[i][1] * last_pwds[j + 1][1], i, j + 1))
+            if j == 0 and i + 1 < len(first_pwds):
+                heapq.heappush(heap, (-first_pwds[i + 1][1] * last_pwds[0][1], i + 1, 0))
+
+    def _get_terminals(self, pattern):
+        key, value = pattern
+        if key == "L":
+            return self.rule_char.get(value, [])
+        elif key == "D":
+            return self.rule_number.get(value, [])
+        return []
+
+    def _expand_tail(self, tail):
+        """尾部展开结果的前 self.limit 条（按笛卡尔积顺序），与 _generate_by_pattern(tail)[:self.limit] 相同
+
+        调用方只会用到尾部的前 limit 条，因此只展开这么多；多段尾部的结果按 (tail, limit) 缓存。
+        """
+        first_pwds = self._get_terminals(tail[0])
+        if(len(tail) == 1):
+            return first_pwds[:self.limit]
+        key = (tail, self.limit)
+        res = self.tail_cache.get(key)
+        if res is None:
+            last_pwds = self._expand_tail(tail[1:])
+            res = []
+            for first_pwd in first_pwds[:self.limit]:
+                for last_pwd in last_pwds[:self.limit - len(res)]:
+                    res.append([first_pwd[0] + last_pwd[0], first_pwd[1] * last_pwd[1]])
+                if len(res) >= self.limit:
+                    break
+            self.tail_cache.put(key, res)
+        self.tail_cache.release(key)
+        return res
+
+    @timed('pcfg._generate_by_pattern')
+    def _generate_by_pattern(self, patterns, p):
+        first_pwds = self._get_terminals(patterns[0])
         if(len(patterns) > 1):
-            last_pwds = self._generate_by_pattern(patterns[1:], p)
-   
+            last_pwds = self._expand_tail(tuple(patterns[1:]))
+
             res = []
             for first_pwd in first_pwds[:self.limit]:
-                for last_pwd in last_pwds[:self.limit]:
+                for last_pwd in last_pwds:
                     res.append([first_pwd[0] + last_pwd[0], first_pwd[1] * last_pwd[1]])
             return res
         else:
             return first_pwds
 
     def _generate_username_token_candidates(self):
+        return list(self._iter_username_token_candidates())
+
+    def _iter_username_token_candidates(self):
+        """按概率降序惰性产出用户名 token 及其与高频数字/字母串的组合"""
         if not self.username_tokens:
-            return []
+            return iter([])
         tokens = self.username_tokens[:self.username_token_limit]
-        numeric_rules = self._get_top_rule_entries(self.rule_number, self.username_numeric_limit)
-        char_rules = self._get_top_rule_entries(self.rule_char, self.username_char_limit)
+        numeric_rules = self.number_index[:self.username_numeric_limit]
+        char_rules = self.char_index[:self.username_char_limit]
+        streams = [
+            iter(tokens),
+            self._iter_product(tokens, numeric_rules),   # token + number
+            self._iter_product(numeric_rules, tokens),   # number + token
+            self._iter_product(tokens, char_rules),      # token + word
+        ]
+        return heapq.merge(*streams, key=lambda item: item[1], reverse=True)
 
-        res = []
-        for token, token_prob in tokens:
-            res.append([token, token_prob])
-            for number, number_prob in numeric_rules:
-                combined = token_prob * number_prob
-                res.append([token + number, combined])
-                res.append([number + token, combined])
-            for word, word_prob in char_rules:
-                combined = token_prob * word_prob
-                res.append([token + word, combined])
-        return res
-
-    def _get_top_rule_entries(self, rule_dict, limit):
-        entries = []
-        for items in rule_dict.values():
-            entries.extend(items)
-        entries.sort(key=lambda item: item[1], reverse=True)
-        return entries[:limit]
+    def _build_rule_index(self, rule_dict):
+        # 各长度的规则已按概率降序，多路归并即可得到全局有序索引，无需整体排序
+        return list(heapq.merge(*rule_dict.values(), key=lambda item: item[1], reverse=True))
 
     def _resolve_username_token_path(self, override_path):
         env_override = os.getenv('USERNAME_TOKEN_FILE')
@@ -186,7 +361,7 @@ class PCFG:
             return override_path
         if env_override:
             return env_override
-        dataset_specific = f'lib/username_tokens_{FILE_NAME}.txt'
+        dataset_specific = f'lib/username_tokens_{self.dataset}.txt'
         dataset_path = os.path.join(self.base_dir, dataset_specific)
         if os.path.exists(dataset_path):
             return dataset_specific
@@ -194,10 +369,13 @@ class PCFG:
 
 if __name__ == "__main__":
     pcfg = PCFG()
-    gen_pwds = pcfg.generate()
-    output_path = os.path.join(pcfg.base_dir, f'{FILE_NAME}_genpwds.txt')
-    with open(output_path, 'w') as f:
-        for gen_pwd in gen_pwds[:200000]:
-            f.write(f'{gen_pwd[0]} {gen_pwd[1]}\n')
-    
-    test(FILE_NAME)
+    if PIPELINE_MODE:
+        pipelined_test(FILE_NAME, pcfg.iter_generate(), max_guesses=GUESS_COUNT)
+    else:
+        gen_pwds = pcfg.generate_parallel(WORKERS) if WORKERS > 1 else pcfg.generate()
+        output_path = os.path.join(pcfg.base_dir, f'{FILE_NAME}_genpwds.txt')
+        with open(output_path, 'w') as f:
+            for gen_pwd in gen_pwds[:GUESS_COUNT]:
+                f.write(f'{gen_pwd[0]} {gen_pwd[1]}\n')
+
+        test(FILE_NAME)
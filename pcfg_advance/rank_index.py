@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+
+# 64 位 FNV-1a
+FNV_OFFSET = 0xcbf29ce484222325
+FNV_PRIME = 0x100000001b3
+MASK = (1 << 64) - 1
+# 构建索引时每次读取的行数
+CHUNK_LINES = 1 << 20
+# 指纹算法变化时递增，旧版本的索引视为过期（2：\x00 字节也参与指纹计算）
+INDEX_VERSION = 2
+
+
+def fingerprint(password):
+    """口令 UTF-8 字节的 64 位 FNV-1a 指纹，与 fingerprints() 的结果一致"""
+    h = FNV_OFFSET
+    for byte in password.encode('utf-8'):
+        h = ((h ^ byte) * FNV_PRIME) & MASK
+    return h
+
+
+def fingerprints(passwords):
+    """批量计算指纹：口令转为定长字节矩阵后按列做 FNV-1a，每列一次向量化运算
+
+    定长数组以 \\x00 补齐，按各口令的字节长度屏蔽补齐部分，口令自身的 \\x00 照常参与计算。
+    """
+    encoded_list = [password.encode('utf-8') for password in passwords]
+    lengths = np.fromiter(map(len, encoded_list), dtype=np.int64, count=len(encoded_list))
+    encoded = np.array(encoded_list, dtype=np.bytes_)
+    n = len(encoded)
+    h = np.full(n, FNV_OFFSET, dtype=np.uint64)
+    if n == 0 or encoded.dtype.itemsize == 0:
+        return h
+    matrix = encoded.view(np.uint8).reshape(n, encoded.dtype.itemsize)
+    prime = np.uint64(FNV_PRIME)
+    with np.errstate(over='ignore'):
+        for j in range(matrix.shape[1]):
+            column = matrix[:, j].astype(np.uint64)
+            h = np.where(j < lengths, (h ^ column) * prime, h)
+    return h
+
+
+def _index_paths(source):
+    stem = f'{source}.idx'
+    return {
+        'meta': f'{stem}.json',
+        'fingerprints': f'{stem}.fp.npy',
+        'ranks': f'{stem}.rank.npy',
+        'probs': f'{stem}.prob.npy',
+    }
+
+
+def _source_signature(source):
+    st = os.stat(source)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _read_chunks(path, chunk_lines=CHUNK_LINES):
+    # 逐块读取，每块至多 chunk_lines 行（已去掉换行符）
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            lines = [line.rstrip('\n') for _, line in zip(range(chunk_lines), f)]
+            if not lines:
+                break
+            yield lines
+
+
+def _read_guesses(source, chunk_lines=CHUNK_LINES):
+    # "口令 概率" 行 -> (口令列表, 概率数组)；缺少概率的行记为 nan
+    for lines in _read_chunks(source, chunk_lines):
+        passwords = []
+        probs = []
+        for line in lines:
+            pwd, _, prob = line.rpartition(' ')
+            if not pwd:
+                pwd, prob = prob, 'nan'
+            passwords.append(pwd)
+            probs.append(prob)
+        yield passwords, np.array(probs, dtype=np.float64)
+
+
+def build_index(source, chunk_lines=CHUNK_LINES):
+    """把生成的口令字典（每行 "口令 概率"，按概率降序）转为按指纹排序的数组
+
+    rank 为口令在文件中的行号（从 1 开始）；同一口令出现多次时保留最靠前的一次。
+    结果写在源文件旁：<源文件>.idx.{fp,rank,prob}.npy 与 .idx.json。
+    """
+    paths = _index_paths(source)
+    fp_parts = []
+    prob_parts = []
+    with stage('rank_index.build') as st:
+        for passwords, probs in _read_guesses(source, chunk_lines):
+            fp_parts.append(fingerprints(passwords))
+            prob_parts.append(probs)
+            st.add(len(passwords))
+        fps = np.concatenate(fp_parts) if fp_parts else np.zeros(0, dtype=np.uint64)
+        probs = np.concatenate(prob_parts) if prob_parts else np.zeros(0, dtype=np.float64)
+        del fp_parts, prob_parts
+
+        rank_dtype = np.uint32 if len(fps) < (1 << 32) else np.uint64
+        # 稳定排序：指纹相同的行保持文件顺序，去重时留下 rank 最小的一行
+        order = np.argsort(fps, kind='stable')
+        fps = fps[order]
+        keep = np.ones(len(fps), dtype=bool)
+        keep[1:] = fps[1:] != fps[:-1]
+        order = order[keep]
+        np.save(paths['fingerprints'], fps[keep])
+        np.save(paths['ranks'], (order + 1).astype(rank_dtype))
+        np.save(paths['probs'], probs[order])
+        st.count('unique', len(order))
+
+    meta = {'version': INDEX_VERSION, 'source': os.path.basename(source), 'lines': int(len(probs)), 'count': int(len(order)), **_source_signature(source)}
+    with open(paths['meta'], 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class RankIndex:
+    """只读的 口令 -> (rank, 概率) 索引，三个数组均以 mmap 方式打开，查询为一次二分查找
+
+    指纹为 64 位，10^8 条字典中不在字典里的口令被误判命中的概率约为 5e-12。
+    """
+
+    def __init__(self, source, rebuild=True):
+        paths = _index_paths(source)
+        fresh = False
+        if os.path.exists(paths['meta']):
+            with open(paths['meta'], 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            # 指纹版本不同的索引一律重建；源文件已删除时直接使用现有索引
+            fresh = meta.get('version') == INDEX_VERSION
+            if fresh and os.path.exists(source):
+                fresh = all(meta.get(key) == value for key, value in _source_signature(source).items())
+        if not fresh:
+            if not rebuild:
+                raise FileNotFoundError(f'{paths["meta"]} 不存在或已过期')
+            build_index(source)
+        with open(paths['meta'], 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.fingerprints = np.load(paths['fingerprints'], mmap_mode='r')
+        self.ranks = np.load(paths['ranks'], mmap_mode='r')
+        self.probs = np.load(paths['probs'], mmap_mode='r')
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __contains__(self, password):
+        return self.lookup(password) is not None
+
+    def lookup(self, password):
+        """返回 (rank, 概率)，不在字典中时返回 None"""
+        fp = fingerprint(password)
+        i = int(self.fingerprints.searchsorted(np.uint64(fp)))
+        if i < len(self.fingerprints) and int(self.fingerprints[i]) == fp:
+            return int(self.ranks[i]), float(self.probs[i])
+        return None
+
+    def rank(self, password):
+        hit = self.lookup(password)
+        return hit[0] if hit else None
+
+    def in_top(self, password, n):
+        hit = self.lookup(password)
+        return hit is not None and hit[0] <= n
+
+    def lookup_many(self, passwords):
+        """批量查询，返回 (ranks, probs)：未命中的 rank 为 0、概率为 nan"""
+        fps = fingerprints(passwords)
+        idx = self.fingerprints.searchsorted(fps)
+        found = idx < len(self.fingerprints)
+        found[found] = self.fingerprints[idx[found]] == fps[found]
+        ranks = np.zeros(len(fps), dtype=np.uint64)
+        probs = np.full(len(fps), np.nan)
+        ranks[found] = self.ranks[idx[found]]
+        probs[found] = self.probs[idx[found]]
+        return ranks, probs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='memory-mapped rank index over *_genpwds.txt')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='为字典建立（或重建）索引')
+    build.add_argument('source')
+    lookup = sub.add_parser('lookup', help='查询若干口令的 rank 与概率')
+    lookup.add_argument('source')
+    lookup.add_argument('passwords', nargs='+')
+    check = sub.add_parser('check', help='统计候选文件（每行一条口令）中落在字典前 N 条的比例')
+    check.add_argument('source')
+    check.add_argument('candidates')
+    check.add_argument('--top', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print(build_index(args.source))
+        return
+
+    started = time.perf_counter()
+    index = RankIndex(args.source)
+    print(f'opened {len(index)} entries in {(time.perf_counter() - started) * 1000:.1f} ms')
+    if args.command == 'lookup':
+        for password in args.passwords:
+            hit = index.lookup(password)
+            print(password, *(hit if hit else ('-', '-')))
+    else:
+        total = hits = 0
+        with stage('rank_index.check') as st:
+            for passwords in _read_chunks(args.candidates):
+                ranks, _ = index.lookup_many(passwords)
+                hit = ranks > 0
+                if args.top:
+                    hit &= ranks <= args.top
+                total += len(passwords)
+                hits += int(hit.sum())
+            st.add(total)
+            st.count('hits', hits)
+        print(f'{hits} / {total} = {hits / total if total else 0:.5f}')
+
+
+if __name__ == '__main__':
+    main()
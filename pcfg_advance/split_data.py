@@ -2,11 +2,17 @@ import pickle
 from progress.bar import Bar
 import os
 import re
+import sys
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+
 FILE_NAME = 'yahoo'
 # FILE_NAME = 'csdn'
+FILE_NAME = os.getenv('PCFG_DATASET', FILE_NAME).lower()
 FILE_PATH = "./data/" + FILE_NAME + ".txt"
+TEST_LINES_PATH = "./data/test_lines_" + FILE_NAME + ".npy"
 TOTAL_COUNT = None
 
 # 读取密码，统计总数
@@ -30,16 +36,19 @@ def init_data():
 
 
 def _filter_data(passwords):
+    # 同时返回保留口令在源文件中的行号，便于找回测试集对应的完整记录
     filtered_data = []
+    line_numbers = []
     bar = Bar(max=len(passwords))
-    for password in passwords:
+    for i, password in enumerate(passwords):
         length = len(password)
         # 数字+小写字母 's12345'
         if(length >= 6 and length <= 12 and re.match(r'[0-9a-z]+$', password)):
             filtered_data.append(password)
+            line_numbers.append(i)
         bar.next()
     bar.finish()
-    return filtered_data
+    return filtered_data, line_numbers
 
 
 def _split_data(data, count=50000):
@@ -53,17 +62,19 @@ def _split_data(data, count=50000):
     train_data = [data[i] for i in train_indexes]
     test_data = [data[i] for i in test_indexes]
 
-    return train_data, test_data
+    return train_data, test_data, test_indexes
 
 
 def filter_split_data(passwords):
     # 构成模式
     data_save_path = './data/data_{}.pkl'.format(FILE_NAME)
     if not os.path.exists(data_save_path):
-        filtered_data = _filter_data(passwords)
-        train_data, test_data = _split_data(filtered_data)
+        filtered_data, line_numbers = _filter_data(passwords)
+        train_data, test_data, test_indexes = _split_data(filtered_data)
         with open(data_save_path, 'wb') as f:
             pickle.dump((train_data, test_data), f)
+        # 测试集记录在源文件中的行号（升序），供 targeted.py 取回用户名
+        np.save(TEST_LINES_PATH, np.sort(np.asarray(line_numbers, dtype=np.int64)[test_indexes]))
     else:
         with open(data_save_path, 'rb') as f:
             train_data, test_data = pickle.load(f)
@@ -71,9 +82,12 @@ def filter_split_data(passwords):
     return train_data, test_data
 
 def main():
-    passwords = init_data()
+    with stage('split_data.load') as st:
+        passwords = init_data()
+        st.add(len(passwords))
 
-    train_data, test_data = filter_split_data(passwords)
+    with stage('split_data.filter_split', items=len(passwords)):
+        train_data, test_data = filter_split_data(passwords)
 
 if __name__ == '__main__':
     main()
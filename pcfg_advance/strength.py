@@ -0,0 +1,100 @@
+import argparse
+import math
+import os
+import sys
+import numpy as np
+from grammar import Grammar
+from test import DATA_DIR, BASE_DIR
+from utils import load_data, load_pcfg_module
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+from password_structure import unique_counts
+
+SAMPLE_COUNT = 100000
+MAX_EXPONENT = 15
+
+
+class StrengthEstimator:
+    """Monte Carlo 猜测数估计（Dell'Amico & Filippone, CCS 2015）
+
+    从文法中抽取 n 个样本，概率为 p_i 的样本代表约 1/(n·p_i) 个概率相近的口令。
+    样本按概率降序排列并对 1/(n·p_i) 做前缀和，得到“概率 -> 估计排名”表；
+    任一口令的猜测数即概率严格大于它的样本权重之和加一，二分查找 O(log n)。
+    估计是无偏的，相对误差随 n 增大按 1/sqrt(n) 缩小。
+
+    得到的是归一化文法（见 Grammar）按概率降序猜测时的猜测数，并非 PCFG.generate() 输出中的排名：
+    generate() 不乘模式概率且对每个模式截断，实际排名需用 rank_index.py 在生成的字典上查询。
+    """
+
+    def __init__(self, grammar, samples=SAMPLE_COUNT, seed=None):
+        self.grammar = grammar
+        self.samples = samples
+        log_probs = np.sort(grammar.sample_log_probs(samples, seed))[::-1]
+        self.log_probs = log_probs
+        # 升序的 -log p，供 searchsorted 查找“概率更大的样本个数”
+        self._neg_log_probs = -log_probs
+        self.ranks = np.cumsum(np.exp(-log_probs - math.log(samples)))
+
+    def guess_numbers(self, log_probs):
+        """对数概率 -> 估计猜测数（无法生成的口令为 inf）"""
+        log_probs = np.asarray(log_probs, dtype=np.float64)
+        k = np.searchsorted(self._neg_log_probs, -log_probs, side='left')
+        ranks = np.concatenate(([0.0], self.ranks))[k] + 1
+        ranks[np.isneginf(log_probs)] = np.inf
+        return ranks
+
+    def guess_number(self, password):
+        return float(self.guess_numbers([self.grammar.log_prob(password)])[0])
+
+    def estimate(self, passwords):
+        return self.guess_numbers(self.grammar.log_probs(passwords))
+
+
+def crack_curve(guess_numbers, weights=None, max_exponent=MAX_EXPONENT):
+    """猜测数为 10^0 .. 10^max_exponent 时被破解的口令数，返回 [(猜测数, 破解数)]"""
+    guess_numbers = np.asarray(guess_numbers, dtype=np.float64)
+    weights = np.ones(len(guess_numbers)) if weights is None else np.asarray(weights, dtype=np.float64)
+    order = np.argsort(guess_numbers)
+    sorted_guesses = guess_numbers[order]
+    cumulative = np.concatenate(([0.0], np.cumsum(weights[order])))
+    curve = []
+    for exponent in range(max_exponent + 1):
+        count = 10 ** exponent
+        k = np.searchsorted(sorted_guesses, count, side='right')
+        curve.append((count, int(cumulative[k])))
+    return curve
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo estimate of guess numbers under the normalized PCFG model '
+                                                 '(not ranks in the generate() output; see rank_index.py for those)')
+    parser.add_argument('--samples', type=int, default=SAMPLE_COUNT, help='从文法中抽取的样本数')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-exponent', type=int, default=MAX_EXPONENT, help='破解曲线的最大猜测数 10^k')
+    args = parser.parse_args()
+
+    pcfg_module = load_pcfg_module()
+    file_name = pcfg_module.FILE_NAME
+    pcfg = pcfg_module.PCFG(record=False)
+    with stage('strength.sample', items=args.samples):
+        grammar = Grammar.from_pcfg(pcfg)
+        estimator = StrengthEstimator(grammar, args.samples, args.seed)
+
+    _, test_data = load_data(os.path.join(DATA_DIR, f'data_{file_name}.pkl'))
+    with stage('strength.estimate', items=len(test_data)) as st:
+        uniques, counts = unique_counts(test_data)
+        guess_numbers = estimator.estimate(uniques)
+        st.count('unique', len(uniques))
+    curve = crack_curve(guess_numbers, counts, args.max_exponent)
+
+    total_count = len(test_data)
+    output_path = os.path.join(BASE_DIR, f'{file_name}_strength_curve.txt')
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for count, cracked in curve:
+            print('10^{:<3d} {:>10d} {:.5f}'.format(int(math.log10(count)), cracked, cracked / total_count))
+            f.write('{} {} {:.5f}\n'.format(count, cracked, cracked / total_count))
+
+
+if __name__ == '__main__':
+    main()
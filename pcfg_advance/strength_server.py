@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import stat
+import sys
+import time
+import numpy as np
+from grammar import Grammar
+from strength import SAMPLE_COUNT, StrengthEstimator
+from utils import load_pcfg_module
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'analysis'))
+
+from username_transform_rules import classify, ensure_category_order  # noqa: E402
+
+HOST = '127.0.0.1'
+PORT = 8421
+# 单批最多合并的请求数；评分期间到达的请求自然排队，下一批一次取走，
+# 因此空闲时请求立即处理，并发高时自动攒成大批。MAX_DELAY>0 时第一个请求后再额外等待
+MAX_BATCH = 256
+MAX_DELAY = 0.0
+# 延迟分位数按最近 LATENCY_WINDOW 个请求计算
+LATENCY_WINDOW = 10000
+# 这两个类别表示口令与用户名无关
+UNRELATED = {'no_relation', 'invalid'}
+
+
+class Metrics:
+    """请求数、批大小与最近请求的延迟分布"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+        self.latencies = collections.deque(maxlen=window)
+
+    def record_batch(self, latencies):
+        self.batches += 1
+        self.requests += len(latencies)
+        self.latencies.extend(latencies)
+
+    def snapshot(self):
+        uptime = time.perf_counter() - self.started
+        res = {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'uptime_s': uptime,
+            'throughput_rps': self.requests / uptime if uptime else 0.0,
+        }
+        if self.latencies:
+            p50, p99 = np.percentile(np.fromiter(self.latencies, dtype=np.float64), [50, 99])
+            res['latency_ms'] = {'p50': p50 * 1000, 'p99': p99 * 1000, 'window': len(self.latencies)}
+        return res
+
+
+class StrengthScorer:
+    """常驻内存的评分器：文法与猜测数表只在启动时构建一次，之后按批评分"""
+
+    def __init__(self, samples=SAMPLE_COUNT, seed=0):
+        pcfg_module = load_pcfg_module()
+        self.dataset = pcfg_module.FILE_NAME
+        pcfg = pcfg_module.PCFG(record=False)
+        self.grammar = Grammar.from_pcfg(pcfg)
+        self.estimator = StrengthEstimator(self.grammar, samples, seed)
+
+    def score_batch(self, items):
+        """items 为 (password, username) 列表，username 可为 None
+
+        对数概率与猜测数整批计算；单条出错时该位置返回异常对象，不影响同批的其它请求。
+        """
+        res = [None] * len(items)
+        valid = []
+        for i, (password, username) in enumerate(items):
+            try:
+                validate_item(password, username)
+                valid.append(i)
+            except TypeError as e:
+                res[i] = e
+        log_probs = self.grammar.log_probs([items[i][0] for i in valid])
+        guess_numbers = self.estimator.guess_numbers(log_probs)
+        for i, log_prob, guess_number in zip(valid, log_probs.tolist(), guess_numbers.tolist()):
+            password, username = items[i]
+            item = {
+                'probability': float(np.exp(log_prob)),
+                'log_probability': log_prob if log_prob != -np.inf else None,
+                # JSON 没有 inf，文法无法生成的口令记为 null
+                'guess_number': guess_number if guess_number != np.inf else None,
+            }
+            try:
+                if username:
+                    categories = classify(username, password)
+                    item['username_flags'] = ensure_category_order(categories)
+                    item['username_reuse'] = not categories <= UNRELATED
+            except Exception as e:
+                item = e
+            res[i] = item
+        return res
+
+
+def validate_item(password, username=None):
+    if not isinstance(password, str):
+        raise TypeError('password 必须是字符串')
+    if username is not None and not isinstance(username, str):
+        raise TypeError('username 必须是字符串或 null')
+
+
+class Batcher:
+    """把并发到达的请求攒成小批：取走队列中已就绪的请求（最多 max_batch 条），
+    max_delay>0 时第一个请求到达后最多再等 max_delay 秒"""
+
+    def __init__(self, scorer, metrics, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.scorer = scorer
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+
+    async def submit(self, password, username=None):
+        validate_item(password, username)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((password, username, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            # 让出一次事件循环，同一时刻已解析完的请求先入队
+            await asyncio.sleep(0)
+            deadline = loop.time() + self.max_delay
+            while self.max_delay > 0 and len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # 队列中已就绪的请求不必再等，一并带走
+            while len(pending) < self.max_batch and not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+            try:
+                results = self.scorer.score_batch([(password, username) for password, username, _, _ in pending])
+            except Exception as e:
+                for _, _, future, _ in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            now = time.perf_counter()
+            for (_, _, future, _), result in zip(pending, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            self.metrics.record_batch([now - started for _, _, _, started in pending])
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = [
+        f'HTTP/1.1 {status}',
+        'Content-Type: application/json; charset=utf-8',
+        f'Content-Length: {len(body)}',
+        'Connection: keep-alive' if keep_alive else 'Connection: close',
+    ]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+
+async def _handle(batcher, metrics, method, path, body):
+    if method == 'GET' and path == '/metrics':
+        return '200 OK', metrics.snapshot()
+    if method == 'GET' and path == '/health':
+        return '200 OK', {'status': 'ok', 'dataset': batcher.scorer.dataset}
+    if method == 'POST' and path == '/score':
+        request = json.loads(body or b'{}')
+        # {"password": ..., "username": ...} 或 {"items": [{...}, ...]}
+        if not isinstance(request, dict):
+            raise TypeError('请求体必须是 JSON 对象')
+        if 'items' in request:
+            items = request['items']
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                raise TypeError('items 必须是对象数组')
+            # 先整体校验，任何一条不合法都不提交
+            for item in items:
+                validate_item(item['password'], item.get('username'))
+            results = await asyncio.gather(*(batcher.submit(item['password'], item.get('username')) for item in items))
+            return '200 OK', {'results': list(results)}
+        return '200 OK', await batcher.submit(request['password'], request.get('username'))
+    return '404 Not Found', {'error': f'unknown endpoint {method} {path}'}
+
+
+def make_handler(batcher, metrics):
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    status, payload = await _handle(batcher, metrics, method, path, body)
+                except (KeyError, TypeError, ValueError) as e:
+                    status, payload = '400 Bad Request', {'error': str(e)}
+                except Exception as e:
+                    status, payload = '500 Internal Server Error', {'error': str(e)}
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle_connection
+
+
+async def serve(host=HOST, port=PORT, unix_path=None, samples=SAMPLE_COUNT, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+    started = time.perf_counter()
+    scorer = StrengthScorer(samples)
+    metrics = Metrics()
+    batcher = Batcher(scorer, metrics, max_batch, max_delay)
+    worker = asyncio.create_task(batcher.run())
+    handler = make_handler(batcher, metrics)
+    if unix_path:
+        # 上次异常退出残留的 socket 文件会导致无法监听
+        if os.path.exists(unix_path) and stat.S_ISSOCK(os.stat(unix_path).st_mode):
+            os.unlink(unix_path)
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+        where = unix_path
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        where = f'http://{host}:{port}'
+    print(f'strength server ({scorer.dataset}) listening on {where}, loaded in {time.perf_counter() - started:.2f}s', flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='local password strength scoring service (HTTP over TCP or a Unix socket)')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', metavar='PATH', help='改为监听 Unix socket')
+    parser.add_argument('--samples', type=int, default=SAMPLE_COUNT, help='猜测数估计的抽样数')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-delay-ms', type=float, default=MAX_DELAY * 1000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.samples, args.max_batch, args.max_delay_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
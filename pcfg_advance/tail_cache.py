@@ -0,0 +1,64 @@
+import collections
+import os
+
+# 缓存中全部尾部展开结果的口令总数上限，超出时按最近最少使用淘汰
+MAX_CACHED = int(os.getenv('PCFG_TAIL_CACHE', '1000000'))
+
+
+class TailCache:
+    """模式尾部（patterns[1:]）展开结果的缓存
+
+    plan() 预先登记每个键还会被用到几次（引用计数），每次使用后 release()，
+    计数归零即刻释放；未登记的键只受容量上限约束，按 LRU 淘汰。
+    """
+
+    def __init__(self, max_cached=MAX_CACHED):
+        self.max_cached = max_cached
+        self.entries = collections.OrderedDict()
+        self.refs = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def plan(self, key):
+        """登记一次引用，返回登记前是否已有引用（已有则其子尾部无需再登记）"""
+        seen = key in self.refs
+        self.refs[key] = self.refs.get(key, 0) + 1
+        return seen
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_cached:
+            return
+        self.entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_cached:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def release(self, key):
+        count = self.refs.get(key)
+        if count is None:
+            return
+        if count > 1:
+            self.refs[key] = count - 1
+            return
+        del self.refs[key]
+        value = self.entries.pop(key, None)
+        if value is not None:
+            self.size -= len(value)
+
+    def clear(self):
+        self.entries.clear()
+        self.refs.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,180 @@
+import heapq
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from utils import load_pcfg_module
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
+DATA_DIR = os.path.join(ROOT_DIR, 'data')
+sys.path.insert(0, os.path.join(ROOT_DIR, 'analysis'))
+
+from username_overlap import parse_record, username_tokens  # noqa: E402
+from username_transform_rules import LEET_MAP, classify  # noqa: E402
+
+TRANSFORM_STATS_PATH = os.path.join(ROOT_DIR, 'analysis', 'results', 'username_transform_stats.json')
+# 与 split_data._filter_data 一致，测试集中只有满足该策略的口令
+PASSWORD_POLICY = re.compile(r'[0-9a-z]{6,12}$')
+# username_transform_rules.classify 中可以直接构造候选口令的类别
+GENERATIVE_CATEGORIES = (
+    'exact_case_sensitive',
+    'exact_casefold',
+    'suffix_digits',
+    'suffix_append',
+    'prefix_digits',
+    'prefix_append',
+    'reverse_username',
+    'leet_substitution',
+    'repeated_username',
+)
+
+
+def load_transform_weights(stats_path=TRANSFORM_STATS_PATH):
+    """读取 username_transform_rules 的统计结果，返回各类别占全部样本的比例"""
+    if not os.path.exists(stats_path):
+        return {category: 1.0 for category in GENERATIVE_CATEGORIES}
+    with open(stats_path, 'r', encoding='utf-8') as f:
+        stats = json.load(f)
+    total = float(stats.get('total_pairs') or 1)
+    counts = stats.get('category_counts', {})
+    return {category: counts.get(category, 0) / total for category in GENERATIVE_CATEGORIES}
+
+
+def load_test_records(dataset, data_dir=DATA_DIR):
+    """按 split_data.py 保存的行号取回测试集记录，逐条产出 (username, email, password)
+
+    只比较口令取值会把与测试集口令相同的训练集记录也算进来，因此按行号定位。
+    """
+    lines_path = os.path.join(data_dir, f'test_lines_{dataset}.npy')
+    if not os.path.exists(lines_path):
+        raise FileNotFoundError(f'{lines_path} 不存在，请删除 data_{dataset}.pkl 后重新运行 split_data.py')
+    wanted = np.load(lines_path).tolist()
+    position = 0
+    with open(os.path.join(data_dir, f'{dataset}.txt'), 'r', encoding='utf-8') as f:
+        for line_number, raw in enumerate(f):
+            if position == len(wanted):
+                break
+            if line_number != wanted[position]:
+                continue
+            position += 1
+            rec = parse_record(raw, dataset)
+            if rec:
+                yield rec.username, rec.email, rec.password
+
+
+class TargetedGuesser:
+    """针对单个用户的口令猜测：用户名 token × 变换类别 × 高频数字/字母串
+
+    所有与用户无关的部分（类别权重 × 终结符概率）在初始化时预先相乘，
+    单个用户只需对自己的几个 token 做乘法与去重，再取前 k 条。
+    """
+
+    def __init__(self, pcfg, stats_path=TRANSFORM_STATS_PATH, terminal_limit=10, token_floor=0.01, policy=PASSWORD_POLICY):
+        self.weights = load_transform_weights(stats_path)
+        self.token_prior = dict(pcfg.username_tokens)
+        self.token_floor = token_floor
+        self.policy = policy
+
+        numbers = self._normalize(pcfg.number_index[:terminal_limit])
+        words = self._normalize(pcfg.char_index[:terminal_limit])
+        self.suffix_digits = [(number, self.weights['suffix_digits'] * p) for number, p in numbers]
+        self.prefix_digits = [(number, self.weights['prefix_digits'] * p) for number, p in numbers]
+        self.suffix_append = [(word, self.weights['suffix_append'] * p) for word, p in words]
+        self.prefix_append = [(word, self.weights['prefix_append'] * p) for word, p in words]
+
+    @staticmethod
+    def _normalize(entries):
+        total = sum(p for _, p in entries) or 1.0
+        return [(content, p / total) for content, p in entries]
+
+    def guesses(self, username, email='', k=100):
+        """返回该用户按得分降序的前 k 条候选 [(口令, 得分), ...]"""
+        username = username.strip()
+        email = email.strip()
+        identities = {username.lower()}
+        if email:
+            identities.add(email.partition('@')[0].lower())
+        tokens = {token.lower() for token in username_tokens(username, email) if len(token) >= 2}
+
+        weights = self.weights
+        scores = {}
+
+        def offer(pwd, score):
+            if score > scores.get(pwd, 0.0):
+                scores[pwd] = score
+
+        offer(username, weights['exact_case_sensitive'])
+        for token in tokens:
+            token_weight = 1.0 if token in identities else self.token_prior.get(token, self.token_floor)
+            offer(token, token_weight * weights['exact_casefold'])
+            offer(token[::-1], token_weight * weights['reverse_username'])
+            offer(token.translate(LEET_MAP), token_weight * weights['leet_substitution'])
+            offer(token * 2, token_weight * weights['repeated_username'])
+            for number, score in self.suffix_digits:
+                offer(token + number, token_weight * score)
+            for number, score in self.prefix_digits:
+                offer(number + token, token_weight * score)
+            for word, score in self.suffix_append:
+                offer(token + word, token_weight * score)
+            for word, score in self.prefix_append:
+                offer(word + token, token_weight * score)
+
+        if self.policy is not None:
+            items = [(pwd, score) for pwd, score in scores.items() if self.policy.match(pwd)]
+        else:
+            items = scores.items()
+        return heapq.nlargest(k, items, key=lambda item: item[1])
+
+    def guess_batch(self, records, k=100):
+        """批量接口：records 为 (username, email) 的可迭代对象，逐个产出候选列表"""
+        for username, email in records:
+            yield self.guesses(username, email, k)
+
+    def evaluate(self, records, k=100):
+        """逐条记录评估：records 为测试集记录 (username, email, password)，见 load_test_records()"""
+        evaluated = 0
+        hits = 0
+        rank_total = 0
+        category_hits = Counter()
+        start = time.perf_counter()
+        for username, email, password in records:
+            evaluated += 1
+            for rank, (pwd, _) in enumerate(self.guesses(username, email, k), start=1):
+                if pwd == password:
+                    hits += 1
+                    rank_total += rank
+                    category_hits.update(classify(username.strip(), password.strip()))
+                    break
+        elapsed = time.perf_counter() - start
+        return {
+            'evaluated': evaluated,
+            'hits': hits,
+            'hit_rate': hits / evaluated if evaluated else 0.0,
+            'mean_rank': rank_total / hits if hits else 0.0,
+            'users_per_sec': evaluated / elapsed if elapsed else 0.0,
+            'category_hits': dict(category_hits),
+        }
+
+
+def main():
+    module = load_pcfg_module()
+    file_name = module.FILE_NAME
+    k = int(os.getenv('TARGETED_GUESSES', '100'))
+
+    pcfg = module.PCFG(record=False)
+    guesser = TargetedGuesser(pcfg)
+    result = guesser.evaluate(load_test_records(file_name), k)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    with open(os.path.join(BASE_DIR, 'res.txt'), 'a', encoding='utf-8') as f:
+        f.write('{}, targeted@{}, result = {}\n'.format(file_name, k, result['hit_rate']))
+
+
+if __name__ == '__main__':
+    main()
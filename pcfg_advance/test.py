@@ -1,10 +1,19 @@
 import os
 import pickle
+import queue
+import sys
+import threading
+from collections import Counter
 from progress.bar import Bar
+from tqdm import tqdm
 from utils import load_data
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import stage
+
 FILE_NAME = 'yahoo'
 # FILE_NAME = 'csdn'
+FILE_NAME = os.getenv('PCFG_DATASET', FILE_NAME).lower()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'data'))
 
@@ -21,13 +30,16 @@ def test(file_name):
     match_count = 0
     matched_lst = []
 
-    bar = Bar(max=len(test_data))
-    for data in test_data:
-        if(data in gen_pwds):
-            match_count += 1
-            matched_lst.append(data)
-        bar.next()
-    bar.finish()
+    with stage('test', items=len(test_data)) as st:
+        bar = Bar(max=len(test_data))
+        for data in test_data:
+            if(data in gen_pwds):
+                match_count += 1
+                matched_lst.append(data)
+            bar.next()
+        bar.finish()
+        st.count('guesses', len(gen_pwds))
+        st.count('matched', match_count)
 
     acc = float(match_count) / float(total_count)
     print(acc)
@@ -39,6 +51,89 @@ def test(file_name):
         f.write(matched_str)
 
 
+def _feed_queue(guesses, guess_queue, max_guesses, batch_size, errors):
+    # 生成端：按批次写入有界队列，队列满时阻塞，避免生成速度远超撞库速度
+    batch = []
+    count = 0
+    try:
+        for guess in guesses:
+            batch.append(guess[0])
+            count += 1
+            if len(batch) >= batch_size:
+                guess_queue.put(batch)
+                batch = []
+            if max_guesses and count >= max_guesses:
+                break
+        if batch:
+            guess_queue.put(batch)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        guess_queue.put(None)
+
+
+def pipelined_test(file_name, guesses, max_guesses=200000, queue_size=64, batch_size=1000, curve_step=10000, engine=None):
+    """边生成边撞库：guesses 为按概率降序的 [口令, 概率] 迭代器
+
+    生成线程把口令分批写入有界队列，撞库端用哈希后的测试集逐条核对，
+    实时刷新命中率并记录破解曲线，结果与 test() 一样写入 res.txt / info.txt。
+    engine 为生成引擎名（如 'markov'），用于区分各引擎的破解曲线文件。
+    """
+    data_path = os.path.join(DATA_DIR, f'data_{file_name}.pkl')
+    _, test_data = load_data(data_path)
+    remaining = Counter(test_data)
+    total_count = len(test_data)
+
+    guess_queue = queue.Queue(maxsize=queue_size)
+    errors = []
+    producer = threading.Thread(target=_feed_queue, args=(guesses, guess_queue, max_guesses, batch_size, errors), daemon=True)
+    producer.start()
+
+    match_count = 0
+    guess_count = 0
+    matched_lst = []
+    curve = []
+    with stage('test.pipelined') as st:
+        bar = tqdm(total=max_guesses or None, unit='guess')
+        while True:
+            batch = guess_queue.get()
+            if batch is None:
+                break
+            for pwd in batch:
+                guess_count += 1
+                hit = remaining.pop(pwd, 0)
+                if hit:
+                    match_count += hit
+                    matched_lst.extend([pwd] * hit)
+                if guess_count % curve_step == 0:
+                    curve.append((guess_count, match_count))
+            bar.update(len(batch))
+            bar.set_postfix(cracked='{:.4%}'.format(match_count / total_count), refresh=False)
+        bar.close()
+        producer.join()
+        st.add(guess_count)
+        st.count('matched', match_count)
+    if errors:
+        raise errors[0]
+    if not curve or curve[-1][0] != guess_count:
+        curve.append((guess_count, match_count))
+
+    acc = float(match_count) / float(total_count)
+    print(acc)
+    with open(os.path.join(BASE_DIR, 'res.txt'), 'a', encoding='utf-8') as f:
+        f.write('{}\n'.format(acc))
+
+    matched_str = '\n'.join([str(item) for item in matched_lst])
+    with open(os.path.join(BASE_DIR, 'info.txt'), 'a', encoding='utf-8') as f:
+        f.write(matched_str)
+
+    curve_name = f'{file_name}_{engine}_crack_curve.txt' if engine else f'{file_name}_crack_curve.txt'
+    with open(os.path.join(BASE_DIR, curve_name), 'w', encoding='utf-8') as f:
+        for count, matched in curve:
+            f.write('{} {} {:.5f}\n'.format(count, matched, matched / total_count))
+    return acc, curve
+
+
 def main():
     test(FILE_NAME)
 
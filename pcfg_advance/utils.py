@@ -1,6 +1,16 @@
-import pickle 
+import importlib.util
+import os
+import pickle
 
 def load_data(file_path):
     with open(file_path, 'rb') as f:
         train_data, test_data = pickle.load(f)
-    return train_data, test_data
\ No newline at end of file
+    return train_data, test_data
+
+def load_pcfg_module():
+    # pcfg.advance.py 的文件名含点号，无法直接 import，这里按路径加载
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pcfg.advance.py')
+    spec = importlib.util.spec_from_file_location('pcfg_advance', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module